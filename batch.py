@@ -0,0 +1,100 @@
+'''
+Batch mode: reads many jobs from a file, written one after another in the
+same format as the user input, and processes them concurrently with asyncio.
+Each job still geocodes, looks up /points, fetches the hourly forecast and
+reverse geocodes in order, but the network waits of different jobs overlap.
+Output is written in the order the jobs appear in the file, as text like
+the interactive mode prints it, or as json lines or csv rows (see
+result_sinks). Jobs are read and written as the batch goes, so memory
+doesn't grow with the size of the file.
+
+    python batch.py jobs.txt [--concurrency N] [--format text|jsonl|csv]
+'''
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import sys
+import input_processor
+import result_sinks
+
+CONCURRENCY = 8
+
+'How many jobs can be started ahead of the oldest one not yet written, per job in flight'
+READ_AHEAD = 4
+
+
+async def run_batch(jobs, concurrency: int = CONCURRENCY, sink: result_sinks.ResultSink | None = None) -> int:
+    '''
+    Processes every job with at most concurrency jobs in flight at once,
+    writing the output of each to sink, printing it by default. A job's
+    output is written as soon as it and every job before it have finished,
+    and only a few jobs are started ahead of the oldest one not written yet.
+    A job that raises an unexpected error, or is cut off by the end of the
+    input, is written as a failure without stopping the rest. Returns the
+    number of jobs.
+    '''
+    if sink is None:
+        sink = result_sinks.TextSink()
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = collections.deque()
+    number = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers = concurrency) as executor:
+        async def run_job(job: tuple) -> list[tuple]:
+            async with semaphore:
+                try:
+                    return await loop.run_in_executor(executor, input_processor.evaluate_records, *job)
+                except Exception as err:
+                    return failure_records(err)
+        try:
+            jobs = iter(jobs)
+            while True:
+                try:
+                    job = next(jobs)
+                except StopIteration:
+                    break
+                except EOFError as err:
+                    'The last job is cut off, so it fails after every job before it is written'
+                    failed = loop.create_future()
+                    failed.set_result(failure_records(err))
+                    pending.append(failed)
+                    break
+                pending.append(asyncio.ensure_future(run_job(job)))
+                if len(pending) >= READ_AHEAD * concurrency:
+                    number += 1
+                    sink.write(number, await pending.popleft())
+            while pending:
+                number += 1
+                sink.write(number, await pending.popleft())
+        finally:
+            'Jobs not started yet are dropped if writing fails, such as when the output pipe closes'
+            for task in pending:
+                task.cancel()
+    sink.close()
+    return number
+
+
+def failure_records(err: Exception) -> list[tuple]:
+    'Returns the output of a job that failed with an unexpected error.'
+    return [
+        (result_sinks.FAILURE, 'FAILED'),
+        (result_sinks.FAILURE, f'{type(err).__name__}: {err}'),
+        (result_sinks.FAILURE, 'ERROR')
+    ]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description = 'Process a file of many jobs concurrently.')
+    parser.add_argument('jobs', help = 'file of jobs, in the same format as the user input')
+    parser.add_argument('--concurrency', type = int, default = CONCURRENCY,
+                        help = 'most jobs to process at once')
+    parser.add_argument('--format', choices = list(result_sinks.SINKS), default = 'text',
+                        help = 'write the output as text, json lines or csv rows')
+    args = parser.parse_args(argv)
+    with open(args.jobs) as f:
+        asyncio.run(run_batch(input_processor.read_jobs(f), args.concurrency, result_sinks.make_sink(args.format)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
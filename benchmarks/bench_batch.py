@@ -0,0 +1,81 @@
+'''
+Compares processing jobs one after another with batch.run_batch, against the
+local mock server so the numbers only depend on the simulated latency.
+
+    python -m benchmarks.bench_batch [--jobs N] [--concurrency N] [--latency SECONDS]
+'''
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import api_nominatim
+import batch
+import geocode_store
+import gridpoints
+import http_cache
+import input_processor
+import result_sinks
+from benchmarks import mock_server
+
+QUERIES = ['TEMPERATURE AIR F 24 MAX', 'HUMIDITY 72 MIN', 'WIND 12 MAX', 'NO MORE QUERIES']
+
+
+def make_jobs(count: int) -> list[tuple]:
+    'Returns count jobs that geocode, fetch and reverse geocode different places.'
+    return [
+        (f'TARGET NOMINATIM Place {i}', 'WEATHER NWS', QUERIES, 'REVERSE NOMINATIM')
+        for i in range(count)
+    ]
+
+
+def run_sequential(jobs: list[tuple]) -> None:
+    for job in jobs:
+        input_processor.evaluate_target(*job)
+
+
+def run_concurrent(jobs: list[tuple], concurrency: int) -> None:
+    with open(os.devnull, 'w') as devnull:
+        asyncio.run(batch.run_batch(jobs, concurrency, result_sinks.TextSink(devnull)))
+
+
+def measure(function, *args) -> float:
+    'Returns how many seconds function takes, starting from empty caches.'
+    with tempfile.TemporaryDirectory() as directory:
+        http_cache.set_default_cache(http_cache.HTTPCache(directory))
+        gridpoints.set_default_index(gridpoints.GridpointIndex(None))
+        geocode_store.set_default_store(geocode_store.GeocodeStore(None))
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+    http_cache.set_default_cache(None)
+    gridpoints.set_default_index(None)
+    geocode_store.set_default_store(None)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmark batch mode against a mock server.')
+    parser.add_argument('--jobs', type = int, default = 16)
+    parser.add_argument('--concurrency', type = int, default = batch.CONCURRENCY)
+    parser.add_argument('--latency', type = float, default = 0.05)
+    args = parser.parse_args()
+    jobs = make_jobs(args.jobs)
+    with mock_server.MockServer(args.latency) as server:
+        api_nominatim.NOMINATIM_URL = api_nominatim.NWS_URL = server.get_url()
+        sequential = measure(run_sequential, jobs)
+        concurrent = measure(run_concurrent, jobs, args.concurrency)
+    print(json.dumps({
+        'benchmark': 'batch',
+        'jobs': args.jobs,
+        'concurrency': args.concurrency,
+        'latency': args.latency,
+        'sequential_seconds': round(sequential, 4),
+        'batch_seconds': round(concurrent, 4),
+        'speedup': round(sequential / concurrent, 2)
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Measures how bulk.run_bulk scales with the number of worker processes, over
+a manifest of synthetic local forecast files, so the numbers only depend on
+the cores of the machine. Every job has its own forecast file so no loaded
+forecast is shared between jobs, and every run starts without snapshots so
+each one parses the json.
+
+    python -m benchmarks.bench_bulk [--jobs N] [--periods N] [--chunk-size N]
+'''
+import argparse
+import json
+import os
+import tempfile
+import time
+import bulk
+import forecast_snapshot
+from benchmarks import synthetic
+
+QUERIES = [
+    'TEMPERATURE AIR F 24 MAX', 'TEMPERATURE FEELS C 72 MIN', 'HUMIDITY 48 MAX',
+    'WIND 12 MIN', 'PRECIPITATION 96 MAX', 'NO MORE QUERIES'
+]
+
+
+def make_manifest(directory: str, count: int, periods: int) -> list[dict]:
+    'Writes count target, forecast and reverse files to directory and returns their jobs.'
+    with open(os.path.join(directory, 'target.json'), 'w') as f:
+        json.dump([{'lat': '33.6', 'lon': '-117.8', 'display_name': 'Irvine'}], f)
+    with open(os.path.join(directory, 'reverse.json'), 'w') as f:
+        json.dump({'lat': '33.61', 'lon': '-117.79', 'display_name': 'Irvine, CA'}, f)
+    jobs = []
+    for i in range(count):
+        weather = os.path.join(directory, f'forecast{i}.json')
+        with open(weather, 'w') as f:
+            json.dump(synthetic.make_forecast(periods, seed = i), f)
+        jobs.append({
+            'id': i,
+            'target': os.path.join(directory, 'target.json'),
+            'weather': weather,
+            'reverse': os.path.join(directory, 'reverse.json'),
+            'queries': QUERIES
+        })
+    return jobs
+
+
+def measure(jobs: list[dict], processes: int, chunk_size: int) -> float:
+    'Returns how many seconds run_bulk takes over every job.'
+    start = time.perf_counter()
+    for result in bulk.run_bulk(jobs, processes, chunk_size):
+        assert not result['failed'], result
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmark bulk mode scaling across processes.')
+    parser.add_argument('--jobs', type = int, default = 256)
+    parser.add_argument('--periods', type = int, default = 1000)
+    parser.add_argument('--chunk-size', type = int, default = bulk.CHUNK_SIZE)
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+    counts = sorted({1, *(2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores), cores})
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = make_manifest(directory, args.jobs, args.periods)
+        seconds = {}
+        for processes in counts:
+            forecast_snapshot.SNAPSHOT_DIRECTORY = os.path.join(directory, f'snapshots{processes}')
+            seconds[processes] = measure(jobs, processes, args.chunk_size)
+    print(json.dumps({
+        'benchmark': 'bulk',
+        'jobs': args.jobs,
+        'periods': args.periods,
+        'cores': cores,
+        'seconds': {str(processes): round(elapsed, 4) for processes, elapsed in seconds.items()},
+        'jobs_per_second': {str(processes): round(args.jobs / elapsed, 1) for processes, elapsed in seconds.items()},
+        'speedup': {str(processes): round(seconds[1] / elapsed, 2) for processes, elapsed in seconds.items()}
+    }))
+
+
+if __name__ == '__main__':
+    main()
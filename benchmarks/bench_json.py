@@ -0,0 +1,101 @@
+'''
+Compares the ways an hourly forecast payload can be decoded into its
+polygon and periods: the old str copy followed by json.loads, the standard
+library straight from bytes, json_decoder with each of its decoders, and
+the streaming loader that skips every other subtree, which json_decoder
+uses past STREAM_BYTES. Payloads are synthetic forecasts
+padded with the fields a real NWS response carries, such as its json-ld
+context, icons and dewpoints, which the queries never use.
+
+    python -m benchmarks.bench_json [--sizes 156,1000,...] [--repeat N]
+'''
+import argparse
+import json
+import timeit
+import forecast_loader
+import json_decoder
+from benchmarks import synthetic
+
+CONTEXT = [
+    'https://geojson.org/geojson-ld/geojson-context.jsonld',
+    {'@version': '1.1', 'wx': 'https://api.weather.gov/ontology#', 'geo': 'http://www.opengis.net/ont/geosparql#',
+     'unit': 'http://codes.wmo.int/common/unit/', '@vocab': 'https://api.weather.gov/ontology#'}
+]
+
+
+def make_payload(periods: int) -> bytes:
+    'Returns an hourly forecast response with periods periods, as the bytes NWS would send.'
+    info = synthetic.make_forecast(periods)
+    info['@context'] = CONTEXT
+    info['properties'].update({
+        'forecastGenerator': 'HourlyForecastGenerator',
+        'generatedAt': '2024-01-01T00:00:00+00:00',
+        'updateTime': '2024-01-01T00:00:00+00:00',
+        'validTimes': '2024-01-01T00:00:00+00:00/P7DT13H',
+        'elevation': {'unitCode': 'wmoUnit:m', 'value': 16.1544}
+    })
+    for period in info['properties']['periods']:
+        period.update({
+            'name': '',
+            'temperatureTrend': None,
+            'dewpoint': {'unitCode': 'wmoUnit:degC', 'value': 12.2222},
+            'icon': 'https://api.weather.gov/icons/land/day/few?size=small',
+            'detailedForecast': ''
+        })
+    return json.dumps(info, indent = 4).encode('utf-8')
+
+
+def decode_str(data: bytes) -> tuple:
+    'The decoding every path did before json_decoder.'
+    info = json.loads(data.decode(encoding = 'utf-8'))
+    return (info['geometry']['coordinates'][0], info['properties']['periods'])
+
+
+def decode_bytes(data: bytes) -> tuple:
+    'The standard library given the bytes, which it decodes itself.'
+    info = json.loads(data)
+    return (info['geometry']['coordinates'][0], info['properties']['periods'])
+
+
+def decode_with(name: str):
+    'Returns a function decoding a payload with json_decoder using decoder name.'
+    def decode(data: bytes) -> tuple:
+        json_decoder.set_decoder(name)
+        return json_decoder.read_forecast(data)
+    return decode
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmark json decoders on NWS forecast payloads.')
+    parser.add_argument('--sizes', default = '156,1000,10000',
+                        help = 'comma separated forecast sizes in periods')
+    parser.add_argument('--repeat', type = int, default = 20)
+    args = parser.parse_args()
+    decoders = {
+        'str_json': decode_str,
+        'bytes_json': decode_bytes,
+        'json': decode_with('json'),
+        'stream': forecast_loader.read_forecast
+    }
+    if json_decoder.orjson is not None:
+        decoders['orjson'] = decode_with('orjson')
+    default = json_decoder.get_decoder()
+    for size in (int(size) for size in args.sizes.split(',') if size):
+        data = make_payload(size)
+        expected = decode_str(data)
+        milliseconds = {}
+        for name, decode in decoders.items():
+            assert decode(data) == expected, name
+            milliseconds[name] = round(min(timeit.repeat(lambda: decode(data), number = 1, repeat = args.repeat)) * 1000, 4)
+        print(json.dumps({
+            'benchmark': 'json',
+            'periods': size,
+            'bytes': len(data),
+            'milliseconds': milliseconds,
+            'speedup': {name: round(milliseconds['str_json'] / value, 2) for name, value in milliseconds.items()}
+        }))
+    json_decoder.set_decoder(default)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+'''
+Load test of server mode: starts a JobServer on a free port and has many
+client threads post the same kinds of jobs, reporting throughput and the
+latency percentiles measured by the clients and by the server. Runs with as
+many clients as workers and with four times as many, while a few more
+clients hold idle keep-alive connections, which must not keep workers from
+the busy ones.
+
+    python -m benchmarks.bench_server [--clients N] [--idle-clients N] [--requests N] [--periods N]
+'''
+import argparse
+import concurrent.futures
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import server
+from benchmarks import synthetic
+
+QUERIES = ['TEMPERATURE AIR F 24 MAX', 'TEMPERATURE FEELS C 72 MIN', 'HUMIDITY 48 MAX', 'WIND 12 MIN']
+
+
+def write_files(directory: str, periods: int) -> dict:
+    'Writes a target, forecast and reverse file into directory and returns a job using them.'
+    paths = {name: os.path.join(directory, f'{name}.json') for name in ('target', 'weather', 'reverse')}
+    with open(paths['target'], 'w') as f:
+        json.dump([{'lat': '33.6', 'lon': '-117.8', 'display_name': 'Target'}], f)
+    with open(paths['weather'], 'w') as f:
+        json.dump(synthetic.make_forecast(periods), f)
+    with open(paths['reverse'], 'w') as f:
+        json.dump({'lat': '33.61', 'lon': '-117.79', 'display_name': 'Reverse'}, f)
+    return {
+        'target': f'TARGET FILE {paths["target"]}',
+        'weather': f'WEATHER FILE {paths["weather"]}',
+        'queries': QUERIES,
+        'reverse': f'REVERSE FILE {paths["reverse"]}'
+    }
+
+
+def post_jobs(port: int, job: dict, count: int) -> list[float]:
+    '''
+    Posts job count times on one keep-alive connection, returning each
+    latency in milliseconds. Reconnects once if the server closed the idle
+    connection just as the request was sent, like HTTP clients do.
+    '''
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    body = json.dumps(job).encode('utf-8')
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            connection.request('POST', '/job', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+        except (ConnectionError, http.client.RemoteDisconnected):
+            connection.close()
+            connection.request('POST', '/job', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+        response.read()
+        latencies.append((time.perf_counter() - start) * 1000)
+    connection.close()
+    return latencies
+
+
+def hold_idle(port: int, job: dict, stop: threading.Event) -> None:
+    'Posts job once on a keep-alive connection and leaves it idle until stop is set.'
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', '/job', json.dumps(job).encode('utf-8'), {'Content-Type': 'application/json'})
+    connection.getresponse().read()
+    stop.wait()
+    connection.close()
+
+
+def run(args, job: dict, clients: int) -> dict:
+    'Returns the results of clients posting jobs to a fresh server, with idle clients alongside.'
+    job_server = server.JobServer('127.0.0.1', 0, args.workers)
+    threading.Thread(target = job_server.serve_forever, daemon = True).start()
+    port = job_server.server_address[1]
+    stop = threading.Event()
+    idle = [threading.Thread(target = hold_idle, args = (port, job, stop)) for i in range(args.idle_clients)]
+    for thread in idle:
+        thread.start()
+    time.sleep(0.1)
+    try:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(clients) as pool:
+            results = list(pool.map(lambda i: post_jobs(port, job, args.requests), range(clients)))
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        for thread in idle:
+            thread.join()
+        job_server.shutdown()
+        job_server.server_close()
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        'benchmark': 'server',
+        'workers': args.workers,
+        'clients': clients,
+        'idle_clients': args.idle_clients,
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'client_p50_ms': round(latencies[len(latencies) // 2], 3),
+        'client_p99_ms': round(latencies[int(len(latencies) * 0.99)], 3),
+        'server': job_server.stats.summary()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Load test server mode.')
+    parser.add_argument('--clients', type = int,
+                        help = 'busy clients, by default as many as workers and then four times as many')
+    parser.add_argument('--idle-clients', type = int, default = 2,
+                        help = 'clients holding an idle keep-alive connection meanwhile')
+    parser.add_argument('--requests', type = int, default = 200, help = 'requests per client')
+    parser.add_argument('--periods', type = int, default = 156)
+    parser.add_argument('--workers', type = int, default = server.WORKERS)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        job = write_files(directory, args.periods)
+        for clients in [args.clients] if args.clients else [args.workers, 4 * args.workers]:
+            print(json.dumps(run(args, job, clients)), flush = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+Micro-benchmark of the start time conversion: the old per-call conversion
+that went through datetime, astimezone and str, against the timestamps module
+converting one time at a time and a whole forecast in one bulk step.
+
+    python -m benchmarks.bench_timestamps [--periods N] [--repeat N]
+'''
+import argparse
+import datetime
+import json
+import timeit
+import timestamps
+from benchmarks import synthetic
+
+
+def proper_time(time: str) -> str:
+    'The conversion the weather classes used before the timestamps module.'
+    year = int(time[0:4])
+    month = int(time[5:7])
+    day = int(time[8:10])
+    hours = int(time[11:13])
+    minutes = int(time[14:16])
+    seconds = int(time[17:19])
+    dt = datetime.datetime(year, month, day, hours, minutes, seconds)
+    nt = dt.astimezone(datetime.timezone.utc)
+    nt = str(nt)
+    new_string = nt[0:nt.find(' ')] + 'T' + nt[nt.find(' ') + 1:]
+    new_string = new_string[:-6] + 'Z'
+    return new_string
+
+
+def convert_each(times: list[str]) -> None:
+    for time in times:
+        timestamps.to_utc_string(time)
+
+
+def convert_each_cold(times: list[str]) -> None:
+    'Converts every time with empty caches, like the first load of a forecast.'
+    timestamps.to_epoch.cache_clear()
+    timestamps.format_utc.cache_clear()
+    convert_each(times)
+
+
+def convert_bulk(times: list[str]) -> None:
+    for epoch in timestamps.bulk_to_epoch(times):
+        timestamps.format_utc(epoch)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmark start time conversion.')
+    parser.add_argument('--periods', type = int, default = 156)
+    parser.add_argument('--repeat', type = int, default = 200)
+    args = parser.parse_args()
+    times = [period['startTime'] for period in synthetic.make_periods(args.periods)]
+    results = {
+        'proper_time': timeit.timeit(lambda: [proper_time(time) for time in times], number = args.repeat),
+        'to_utc_string_cold': timeit.timeit(lambda: convert_each_cold(times), number = args.repeat),
+        'to_utc_string': timeit.timeit(lambda: convert_each(times), number = args.repeat),
+        'bulk_to_epoch': timeit.timeit(lambda: timestamps.bulk_to_epoch(times), number = args.repeat),
+        'bulk_and_format': timeit.timeit(lambda: convert_bulk(times), number = args.repeat)
+    }
+    per_period = args.periods * args.repeat
+    print(json.dumps({
+        'benchmark': 'timestamps',
+        'periods': args.periods,
+        'repeat': args.repeat,
+        'microseconds_per_period': {name: round(seconds / per_period * 1e6, 4) for name, seconds in results.items()}
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+'''
+Local mock of the Nominatim and National Weather Service APIs with a
+configurable delay before every response, so the network paths can be
+benchmarked without touching (or being rate limited by) the real services.
+
+    python -m benchmarks.mock_server [--port N] [--latency SECONDS]
+'''
+import argparse
+import hashlib
+import http.server
+import json
+import math
+import threading
+import time
+import urllib.parse
+from benchmarks import synthetic
+
+GRID_SIZE = 0.02
+
+
+class MockServer:
+    '''
+    Serves /search, /reverse, /points/{lat},{lon} and the hourly forecast of
+    every grid cell, waiting latency seconds before answering each request.
+    Forecasts have periods periods and grid cell polygons of vertices points,
+    and move forward an hour with every call to advance. Responses carry an
+    ETag, and conditional requests for unchanged ones are answered with 304.
+    Counts requests by endpoint in self.requests.
+    '''
+    def __init__(self, latency: float = 0.05, periods: int = 156, port: int = 0, vertices: int = 4):
+        self.latency = latency
+        self.periods = periods
+        self.vertices = vertices
+        self.hour = 0
+        self.requests = {}
+        self._forecasts = {}
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def get_url(self) -> str:
+        'Returns the base url to point api_nominatim.NOMINATIM_URL and NWS_URL at.'
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target = self._server.serve_forever, daemon = True)
+        self._thread.start()
+        return self.get_url()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def advance(self, hours: int = 1) -> None:
+        'Moves every forecast forward, dropping its first periods and adding new ones at the end.'
+        with self._lock:
+            self.hour += hours
+
+    def respond(self, path: str) -> tuple:
+        'Returns (status, body) for a request to path.'
+        parts = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        endpoint = parts.path.split('/')[1]
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if endpoint == 'search':
+            latitude, longitude = _geocode(query.get('q', ''))
+            return (200, {'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+                'properties': {'display_name': query.get('q', '')}
+            }]})
+        elif endpoint == 'reverse':
+            return (200, {'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature',
+                'properties': {'display_name': f'Mock place near {query["lat"]}, {query["lon"]}'}
+            }]})
+        elif endpoint == 'points':
+            latitude, longitude = (float(x) for x in parts.path.split('/')[2].split(','))
+            x, y = math.floor(longitude / GRID_SIZE), math.floor(latitude / GRID_SIZE)
+            return (200, {'properties': {
+                'gridId': 'MCK',
+                'gridX': x,
+                'gridY': y,
+                'forecastHourly': f'{self.get_url()}/gridpoints/MCK/{x},{y}/forecast/hourly'
+            }})
+        elif endpoint == 'gridpoints':
+            x, y = (int(v) for v in parts.path.split('/')[3].split(','))
+            return (200, self._forecast(x, y))
+        return (404, {'title': 'Not Found'})
+
+    def _forecast(self, x: int, y: int) -> dict:
+        'Returns the forecast of grid cell (x, y) at the current hour, generated once per cell and hour.'
+        with self._lock:
+            key = (x, y, self.hour)
+            if key not in self._forecasts:
+                forecast = synthetic.make_forecast(
+                    self.periods + self.hour, y * GRID_SIZE, x * GRID_SIZE, seed = x * 7919 + y,
+                    vertices = self.vertices
+                )
+                periods = forecast['properties']['periods']
+                forecast['properties']['periods'] = periods[self.hour:]
+                self._forecasts[key] = forecast
+            return self._forecasts[key]
+
+
+def _handler(mock: MockServer):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(mock.latency)
+            status, info = mock.respond(self.path)
+            body = json.dumps(info).encode('utf-8')
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            if status == 200 and self.headers.get('If-None-Match') == etag:
+                status = 304
+                body = b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/geo+json')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+def _geocode(query: str) -> tuple:
+    'Returns a stable made up (latitude, longitude) in the United States for query.'
+    digest = hashlib.sha256(query.encode('utf-8')).digest()
+    latitude = 30 + digest[0] / 255 * 15
+    longitude = -120 + digest[1] / 255 * 40
+    return (round(latitude, 4), round(longitude, 4))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Run a mock Nominatim/NWS server.')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--latency', type = float, default = 0.05)
+    parser.add_argument('--periods', type = int, default = 156)
+    args = parser.parse_args()
+    server = MockServer(args.latency, args.periods, args.port)
+    print(f'Serving on {server.get_url()}')
+    server.serve_forever()
@@ -0,0 +1,230 @@
+'''
+Benchmark suite over every stage of a run: loading forecast files, answering
+queries, polygon geometry, geocoding and whole jobs end to end. Forecasts are
+synthetic, from 156 periods (a real NWS hourly forecast) up to millions, and
+polygons have up to 100k vertices. Geocoding and end-to-end scenarios run
+against the local mock Nominatim/NWS server with a configurable latency.
+
+Every result is printed as one json line, tagged with the time, the python
+version and the platform, and appended to --output if given, so runs can be
+compared over time to catch regressions.
+
+    python -m benchmarks.suite [--scenarios load,query,...] [--sizes 156,10000,...]
+                               [--vertices 4,1000,...] [--latency SECONDS]
+                               [--targets N] [--repeat N] [--output FILE]
+'''
+import argparse
+import contextlib
+import json
+import os
+import platform
+import tempfile
+import time
+import api_nominatim
+import forecast_snapshot
+import geocode_store
+import geometry
+import gridpoints
+import http_cache
+import input_processor
+import query_planner
+import test_from_path
+from benchmarks import mock_server
+from benchmarks import synthetic
+
+SCENARIOS = ('load', 'query', 'polygon', 'geocode', 'end_to_end')
+SIZES = (156, 10000, 100000)
+VERTICES = (4, 1000, 100000)
+
+'One of every kind of query, all over the whole forecast'
+MANY_QUERIES = [
+    f'{metric} {length} {limit}'
+    for metric in ('TEMPERATURE AIR F', 'TEMPERATURE FEELS C', 'HUMIDITY', 'WIND', 'PRECIPITATION')
+    for length in (1, 12, 24, 48, 72, 96, 120, 156)
+    for limit in ('MAX', 'MIN')
+]
+
+
+def best_of(repeat: int, function, *args) -> float:
+    'Returns the fewest seconds function took over repeat calls.'
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_cold(path: str, use_snapshot: bool = False) -> None:
+    'Loads a forecast file without reusing an already loaded copy.'
+    test_from_path._loaded_forecasts.clear()
+    test_from_path.WeatherFile(path, use_snapshot = use_snapshot)
+
+
+def answer_cold(weather, queries: list[str]) -> None:
+    'Answers queries without reusing the answers memoized for the forecast.'
+    query_planner._answers.clear()
+    query_planner.answer_queries(weather, queries)
+
+
+def bench_load(args, directory: str):
+    for size in args.sizes:
+        path = _forecast_file(directory, size)
+        yield {
+            'scenario': 'load', 'periods': size, 'bytes': os.path.getsize(path),
+            'seconds': best_of(args.repeat, load_cold, path)
+        }
+        load_cold(path, True)
+        yield {
+            'scenario': 'load_snapshot', 'periods': size,
+            'bytes': os.path.getsize(forecast_snapshot.snapshot_path(path)),
+            'seconds': best_of(args.repeat, load_cold, path, True)
+        }
+
+
+def bench_query(args, directory: str):
+    for size in args.sizes:
+        weather = test_from_path.WeatherFile(_forecast_file(directory, size))
+        single = [f'TEMPERATURE AIR F {size} MAX', 'NO MORE QUERIES']
+        many = [query for query in MANY_QUERIES if int(query.split()[-2]) <= size] + ['NO MORE QUERIES']
+        for name, queries in (('single', single), ('many', many)):
+            yield {
+                'scenario': f'query_{name}', 'periods': size, 'queries': len(queries) - 1,
+                'seconds': best_of(args.repeat, answer_cold, weather, queries)
+            }
+            query_planner.answer_queries(weather, queries)
+            yield {
+                'scenario': f'query_{name}_memoized', 'periods': size, 'queries': len(queries) - 1,
+                'seconds': best_of(args.repeat, query_planner.answer_queries, weather, queries)
+            }
+
+
+def bench_polygon(args, directory: str):
+    for vertices in args.vertices:
+        polygon = synthetic.make_ring(33.6, -117.8, vertices)
+        latitude, longitude = geometry.distinct_center(polygon)
+        for name, function, extra in (
+            ('distinct_center', geometry.distinct_center, ()),
+            ('area_centroid', geometry.area_centroid, ()),
+            ('contains', geometry.contains, (latitude, longitude))
+        ):
+            yield {
+                'scenario': f'polygon_{name}', 'vertices': vertices,
+                'seconds': best_of(args.repeat, function, polygon, *extra)
+            }
+
+
+def bench_geocode(args, directory: str):
+    with mock_server.MockServer(args.latency) as server:
+        api_nominatim.NOMINATIM_URL = api_nominatim.NWS_URL = server.get_url()
+        places = [f'Place {i}' for i in range(args.targets)]
+
+        def geocode() -> None:
+            for place in places:
+                target = api_nominatim.TargetNominatim(place)
+                api_nominatim.ReverseNominatim(target.get_latitude(), target.get_longitude()).get_display_name()
+
+        with _fresh_caches():
+            cold = best_of(1, geocode)
+            warm = best_of(args.repeat, geocode)
+    for name, seconds in (('cold', cold), ('warm', warm)):
+        yield {
+            'scenario': f'geocode_{name}', 'targets': args.targets, 'latency': args.latency,
+            'seconds': seconds
+        }
+
+
+def bench_end_to_end(args, directory: str):
+    queries = MANY_QUERIES + ['NO MORE QUERIES']
+    with mock_server.MockServer(args.latency) as server:
+        api_nominatim.NOMINATIM_URL = api_nominatim.NWS_URL = server.get_url()
+        for name, count in (('single_target', 1), ('many_targets', args.targets)):
+            jobs = [
+                (f'TARGET NOMINATIM Place {i}', 'WEATHER NWS', queries, 'REVERSE NOMINATIM')
+                for i in range(count)
+            ]
+
+            def run() -> None:
+                for job in jobs:
+                    input_processor.evaluate_target(*job)
+
+            with _fresh_caches():
+                seconds = best_of(1, run)
+            yield {
+                'scenario': f'end_to_end_{name}', 'targets': count, 'queries': len(queries) - 1,
+                'latency': args.latency, 'seconds': seconds
+            }
+
+
+BENCHMARKS = {
+    'load': bench_load,
+    'query': bench_query,
+    'polygon': bench_polygon,
+    'geocode': bench_geocode,
+    'end_to_end': bench_end_to_end
+}
+
+
+@contextlib.contextmanager
+def _fresh_caches():
+    'Points the HTTP cache, gridpoint index and geocode store at empty ones while in use.'
+    with tempfile.TemporaryDirectory() as directory:
+        http_cache.set_default_cache(http_cache.HTTPCache(directory))
+        gridpoints.set_default_index(gridpoints.GridpointIndex(None))
+        geocode_store.set_default_store(geocode_store.GeocodeStore(None))
+        try:
+            yield
+        finally:
+            http_cache.set_default_cache(None)
+            gridpoints.set_default_index(None)
+            geocode_store.set_default_store(None)
+
+
+def _forecast_file(directory: str, size: int) -> str:
+    'Returns the path of a synthetic forecast with size periods, writing it the first time.'
+    path = os.path.join(directory, f'forecast{size}.json')
+    if not os.path.exists(path):
+        synthetic.write_forecast(path, size)
+    return path
+
+
+def _numbers(text: str) -> list[int]:
+    return [int(number) for number in text.split(',') if number]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description = 'Run the benchmark suite and print json results.')
+    parser.add_argument('--scenarios', default = ','.join(SCENARIOS),
+                        help = f'comma separated scenarios out of {", ".join(SCENARIOS)}')
+    parser.add_argument('--sizes', type = _numbers, default = list(SIZES),
+                        help = 'comma separated forecast sizes in periods, such as 156,10000,1000000')
+    parser.add_argument('--vertices', type = _numbers, default = list(VERTICES),
+                        help = 'comma separated polygon sizes in vertices')
+    parser.add_argument('--latency', type = float, default = 0.01,
+                        help = 'seconds the mock server waits before every response')
+    parser.add_argument('--targets', type = int, default = 16,
+                        help = 'targets geocoded and processed by the many target scenarios')
+    parser.add_argument('--repeat', type = int, default = 3,
+                        help = 'times every timing is repeated, keeping the best')
+    parser.add_argument('--output', help = 'json lines file to append the results to')
+    args = parser.parse_args(argv)
+    run = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform()
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        forecast_snapshot.SNAPSHOT_DIRECTORY = os.path.join(directory, 'snapshots')
+        for scenario in args.scenarios.split(','):
+            for result in BENCHMARKS[scenario](args, directory):
+                result['seconds'] = round(result['seconds'], 6)
+                line = json.dumps({'benchmark': 'suite', **result, **run})
+                print(line, flush = True)
+                if args.output:
+                    with open(args.output, 'a') as f:
+                        f.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+Generates synthetic forecasts in the same geojson format as the National
+Weather Service hourly forecast, for benchmarks that shouldn't depend on the
+network or on real data files.
+Large forecasts, up to millions of periods, can be written straight to a
+file without holding them in memory.
+'''
+import datetime
+import json
+import math
+import random
+
+START = datetime.datetime(2024, 1, 1, tzinfo = datetime.timezone(datetime.timedelta(hours = -8)))
+
+
+def make_periods(count: int, seed: int = 0) -> list[dict]:
+    'Returns count hourly forecast periods with random weather.'
+    return list(iter_periods(count, seed))
+
+
+def iter_periods(count: int, seed: int = 0):
+    'Yields count hourly forecast periods with random weather, one at a time.'
+    rng = random.Random(seed)
+    for i in range(count):
+        start = START + datetime.timedelta(hours = i)
+        yield {
+            'number': i + 1,
+            'startTime': start.isoformat(),
+            'endTime': (start + datetime.timedelta(hours = 1)).isoformat(),
+            'isDaytime': 6 <= start.hour < 18,
+            'temperature': rng.randint(10, 105),
+            'temperatureUnit': 'F',
+            'probabilityOfPrecipitation': {'unitCode': 'wmoUnit:percent', 'value': rng.randint(0, 100)},
+            'relativeHumidity': {'unitCode': 'wmoUnit:percent', 'value': rng.randint(5, 100)},
+            'windSpeed': f'{rng.randint(0, 40)} mph',
+            'windDirection': rng.choice(['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']),
+            'shortForecast': 'Sunny'
+        }
+
+
+def make_polygon(latitude: float, longitude: float, size: float = 0.02) -> list[list[float]]:
+    'Returns a closed square grid cell polygon of [longitude, latitude] pairs.'
+    return [
+        [longitude, latitude],
+        [longitude + size, latitude],
+        [longitude + size, latitude + size],
+        [longitude, latitude + size],
+        [longitude, latitude]
+    ]
+
+
+def make_ring(latitude: float, longitude: float, vertices: int, size: float = 0.02) -> list[list[float]]:
+    '''
+    Returns a closed polygon of [longitude, latitude] pairs with vertices
+    distinct points on a circle, for polygons far larger than a grid cell's.
+    '''
+    if vertices <= 4:
+        return make_polygon(latitude, longitude, size)
+    radius = size / 2
+    ring = [
+        [longitude + radius + radius * math.cos(2 * math.pi * i / vertices),
+         latitude + radius + radius * math.sin(2 * math.pi * i / vertices)]
+        for i in range(vertices)
+    ]
+    ring.append(ring[0])
+    return ring
+
+
+def make_forecast(count: int, latitude: float = 33.6, longitude: float = -117.8, seed: int = 0,
+                  vertices: int = 4) -> dict:
+    'Returns a whole hourly forecast geojson with count periods.'
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [make_ring(latitude, longitude, vertices)]
+        },
+        'properties': {
+            'updated': START.isoformat(),
+            'units': 'us',
+            'periods': make_periods(count, seed)
+        }
+    }
+
+
+def write_forecast(path: str, count: int, latitude: float = 33.6, longitude: float = -117.8, seed: int = 0,
+                   vertices: int = 4) -> None:
+    '''
+    Writes the same forecast as make_forecast to path, encoding one period
+    at a time so forecasts of millions of periods fit in memory.
+    '''
+    forecast = make_forecast(0, latitude, longitude, seed, vertices)
+    head = json.dumps(forecast)
+    head = head[:head.rindex('[]')]
+    with open(path, 'w') as f:
+        f.write(head + '[')
+        for i, period in enumerate(iter_periods(count, seed)):
+            if i:
+                f.write(', ')
+            f.write(json.dumps(period))
+        f.write(']}}')
@@ -0,0 +1,130 @@
+'''
+Bulk mode: evaluates a manifest of local TARGET FILE / WEATHER FILE /
+REVERSE FILE jobs on a pool of processes, so offline reprocessing uses every
+core. Jobs are sent to the workers in chunks, and each result is written as
+one json line tagged with the job's id, in manifest order by default. A job
+that fails, whether with a MISSING/FORMAT failure or an unexpected error, is
+reported on its own line without stopping the rest.
+
+The manifest has one json job per line, with paths relative to the current
+directory:
+
+    {"id": "irvine", "target": "target.json", "weather": "forecast.json",
+     "reverse": "reverse.json", "queries": ["WIND 24 MAX", ...]}
+
+    python bulk.py manifest.jsonl [--processes N] [--chunk-size N] [--unordered]
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from collections.abc import Iterable, Iterator
+import input_processor
+
+CHUNK_SIZE = 16
+
+
+class _UnreadableJob:
+    '''
+    A manifest line that isn't a json object, with its line number and why,
+    which run_job reports as a failed job instead of running it.
+    '''
+    def __init__(self, number: int, error: str):
+        self.number = number
+        self.error = error
+
+
+def read_manifest(lines: Iterable[str]) -> Iterator[dict | _UnreadableJob]:
+    '''
+    Reads every job from the lines of a manifest, skipping blank lines. Jobs
+    without an id are given their line number. A line that isn't a json
+    object is yielded as an unreadable job, so one bad line can't stop a
+    batch.
+    '''
+    for number, line in enumerate(lines, start = 1):
+        if line.strip() == '':
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as err:
+            yield _UnreadableJob(number, f'{type(err).__name__}: {err}')
+            continue
+        if not isinstance(job, dict):
+            yield _UnreadableJob(number, 'job is not a json object')
+            continue
+        job.setdefault('id', number)
+        yield job
+
+
+def run_job(job: dict | _UnreadableJob) -> dict:
+    '''
+    Returns the result of one manifest job as a library with its 'id', its
+    output 'lines' and whether it 'failed'. Unexpected errors are returned as
+    'error' instead of raised, so one bad job can't stop a batch. A line
+    read_manifest couldn't read fails with its line number as its id.
+    '''
+    if isinstance(job, _UnreadableJob):
+        return _failure(job.number, f'line {job.number}: {job.error}')
+    if not isinstance(job, dict):
+        return _failure(None, f'job is not a json object: {job!r}')
+    try:
+        queries = list(job.get('queries', []))
+        if not queries or queries[-1] != 'NO MORE QUERIES':
+            queries.append('NO MORE QUERIES')
+        lines = input_processor.evaluate_target(
+            f"TARGET FILE {job['target']}",
+            f"WEATHER FILE {job['weather']}",
+            queries,
+            f"REVERSE FILE {job['reverse']}"
+        )
+    except Exception as err:
+        return _failure(job.get('id'), f'{type(err).__name__}: {err}')
+    return {'id': job['id'], 'failed': bool(lines) and lines[0] == 'FAILED', 'lines': lines}
+
+
+def _failure(job_id, error: str) -> dict:
+    return {'id': job_id, 'failed': True, 'error': error}
+
+
+def run_bulk(jobs: Iterable[dict], processes: int | None = None, chunk_size: int = CHUNK_SIZE,
+             ordered: bool = True) -> Iterator[dict]:
+    '''
+    Yields the result of every job, evaluated on processes worker processes
+    (one per core by default) that are sent chunk_size jobs at a time.
+    Results are yielded in the order of jobs, or as soon as they finish if
+    ordered is False.
+    '''
+    if processes == 1:
+        yield from map(run_job, jobs)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        if ordered:
+            yield from pool.imap(run_job, jobs, chunk_size)
+        else:
+            yield from pool.imap_unordered(run_job, jobs, chunk_size)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description = 'Evaluate a manifest of local file jobs on every core.')
+    parser.add_argument('manifest', help = 'file with one json job per line')
+    parser.add_argument('--processes', type = int, default = os.cpu_count(),
+                        help = 'worker processes, one per core by default')
+    parser.add_argument('--chunk-size', type = int, default = CHUNK_SIZE,
+                        help = 'jobs sent to a worker at a time')
+    parser.add_argument('--unordered', action = 'store_true',
+                        help = 'write results as they finish instead of in manifest order')
+    args = parser.parse_args(argv)
+    total = 0
+    failed = 0
+    with open(args.manifest) as f:
+        for result in run_bulk(read_manifest(f), args.processes, args.chunk_size, not args.unordered):
+            print(json.dumps(result))
+            total += 1
+            failed += result['failed']
+    print(f'{total} jobs, {failed} failed', file = sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
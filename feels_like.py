@@ -0,0 +1,69 @@
+'''
+Calculates the feels like temperature using the formula listed in the project
+notes: the heat index when it is 68F or warmer, the wind chill when it is 50F
+or colder with wind over 3mph, and the air temperature otherwise. Works on a
+single period or on whole columns of periods at once, vectorized with NumPy
+when it is installed, so it can also be run over bulk historical data.
+'''
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def feels_like(temp: float, humidity: float, windspeed: float) -> float:
+    '''
+    Returns the feels like temperature of one period. Generic naming since it
+    isn't specified what each number represents.
+    '''
+    if temp >= 68:
+        a = -42.379
+        b = 2.04901523 * temp
+        c = 10.14333127 * humidity
+        d = -0.22475541 * temp * humidity
+        e = -0.00683783 * pow(temp, 2)
+        f = -0.05481717 * pow(humidity, 2)
+        g = 0.00122874 * pow(temp, 2) * humidity
+        h = 0.00085282 * temp * pow(humidity, 2)
+        i = -0.00000199 * pow(temp, 2) * pow(humidity, 2)
+        return a + b + c + d + e + f + g + h + i
+    elif temp <= 50 and windspeed > 3:
+        a = 35.74
+        b = 0.6215 * temp
+        c = -35.75 * pow(windspeed, 0.16)
+        d = 0.4275 * temp * pow(windspeed, 0.16)
+        return a + b + c + d
+    else:
+        return temp
+
+
+def feels_like_column(temperature, humidity, windspeed):
+    '''
+    Returns the feels like temperature of every period, given equally long
+    sequences of temperature, humidity and wind speed. Returns a NumPy array
+    when NumPy is installed, and an array.array otherwise.
+    '''
+    if numpy is None:
+        return array.array('d', map(feels_like, temperature, humidity, windspeed))
+    temp = numpy.asarray(temperature, dtype = float)
+    humidity = numpy.asarray(humidity, dtype = float)
+    windspeed = numpy.asarray(windspeed, dtype = float)
+    heat_index = (
+        -42.379
+        + 2.04901523 * temp
+        + 10.14333127 * humidity
+        + -0.22475541 * temp * humidity
+        + -0.00683783 * temp ** 2
+        + -0.05481717 * humidity ** 2
+        + 0.00122874 * temp ** 2 * humidity
+        + 0.00085282 * temp * humidity ** 2
+        + -0.00000199 * temp ** 2 * humidity ** 2
+    )
+    wind = windspeed ** 0.16
+    wind_chill = 35.74 + 0.6215 * temp + -35.75 * wind + 0.4275 * temp * wind
+    return numpy.where(
+        temp >= 68, heat_index,
+        numpy.where((temp <= 50) & (windspeed > 3), wind_chill, temp)
+    )
@@ -0,0 +1,153 @@
+'''
+The forecast engine shared by every weather source. A Forecast holds the
+polygon of the grid cell, the forecast periods as columns and the index
+over them, and answers every query from those, wherever the data came from.
+Sources such as WeatherFile and WeatherNominatim only load the polygon and
+the periods and hand them to Forecast, so the query paths live in one place.
+'''
+import forecast_columns
+import forecast_index
+import geometry
+import timestamps
+
+
+class Forecast:
+    '''
+    Answers queries over the columns of a forecast and its polygon. The index
+    over the columns is built unless one that was already built is given.
+    '''
+    def __init__(self, polygon: list, columns: forecast_columns.ForecastColumns,
+                 index: forecast_index.ForecastIndex | None = None):
+        self._polygon = polygon
+        self._columns = columns
+        self._index = index if index is not None else build_index(columns)
+
+    def get_columns(self) -> forecast_columns.ForecastColumns:
+        '''
+        Returns the columns of the forecast, which every object loaded from
+        the same data shares, so they also identify the forecast.
+        '''
+        return self._columns
+
+    def temperature_air(self, scale: str, length: int, limit: str) -> str:
+        '''
+        Returns string with the time that the max/min temperature occurs,
+        followed by that temperature in the desired scale, 
+        '''
+        index, temp = self._index.prefix('temperature', length, limit)
+        if scale == 'C':
+            temp = (temp - 32) * (5 / 9)
+        time = self.get_time(index)
+        return time + ' ' + f'{temp:.4f}'
+    
+    def temperature_feels(self, scale: str, length: int, limit: str) -> str:
+        '''
+        Returns string with the time that the max/min "feels temperature"
+        occurs, followed by that "feels temperature" in the desired scale.
+        '''
+        index, feels_like = self._index.prefix('feels', length, limit)
+        if scale == 'C':
+            feels_like = (feels_like - 32) * (5 / 9)
+        time = self.get_time(index)
+        return time + ' ' + f'{feels_like:.4f}'
+
+    def humidity(self, length: int, limit: str) -> str:
+        '''
+        Returns string with the time that the max/min humidity occurs, followed
+        by that humidity value in farenheit.
+        '''
+        index, humidity = self._index.prefix('humidity', length, limit)
+        time = self.get_time(index)
+        return f'{time} {humidity:.4f}%'
+
+    def wind(self, length: int, limit: str) -> str:
+        '''
+        Returns string with the time that the max/min windspeed occurs, followed
+        by the speed in mph.
+        '''
+        index, wind = self._index.prefix('wind', length, limit)
+        time = self.get_time(index)
+        return f'{time} {wind:.4f}'
+
+    def precipitation(self, length: int, limit: str) -> str:
+        '''
+        Returns string with the time that the max/min precipitation occurs,
+        followed by the precipitation value in farenheit.
+        '''
+        index, precipitation = self._index.prefix('precipitation', length, limit)
+        time = self.get_time(index)
+        return f'{time} {precipitation:.4f}%'
+
+    def get_extreme(self, metric: str, length: int, limit: str) -> tuple:
+        '''
+        Returns (index, value) of the max/min of the given metric
+        ('temperature', 'feels', 'humidity', 'wind' or 'precipitation') over
+        the first length periods, looked up in the index.
+        '''
+        return self._index.prefix(metric, length, limit)
+
+    def get_window_extreme(self, metric: str, start: int, end: int, limit: str) -> tuple:
+        '''
+        Returns (index, value) of the max/min of the given metric over the
+        periods from start up to but not including end.
+        '''
+        return self._index.window(metric, start, end, limit)
+
+    def get_aggregate(self, metric: str, start: int, end: int, kind: str) -> tuple:
+        '''
+        Returns (index, value) of the average ('AVG'), sum ('SUM') or a
+        percentile ('P50', 'P90', ...) of the given metric over the periods
+        from start up to but not including end.
+        '''
+        return self._index.aggregate(metric, start, end, kind)
+
+    def get_daily(self, metric: str, limit: str) -> list[tuple]:
+        '''
+        Returns (date, index, value) of the max/min, average, sum or
+        percentile of the given metric over every local day of the forecast.
+        '''
+        daily = []
+        for date, first, end in self._columns.get_days():
+            if limit in ('MAX', 'MIN'):
+                index, value = self._index.window(metric, first, end, limit)
+            else:
+                index, value = self._index.aggregate(metric, first, end, limit)
+            daily.append((date, index, value))
+        return daily
+
+    def get_time(self, index: int) -> str:
+        'Returns the start time of the period at index, in UTC.'
+        return timestamps.format_utc(int(self._columns.get_start()[index]))
+
+    def get_polygon(self, area_weighted: bool = False) -> tuple:
+        '''
+        Gets the average latitude and longitude from all the distinct
+        coordinates listed in the polygon in the API website, or the
+        area-weighted centroid of the polygon if area_weighted.
+        '''
+        if area_weighted:
+            return geometry.area_centroid(self._polygon)
+        return geometry.distinct_center(self._polygon)
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        'Returns whether the coordinates are inside the polygon of this forecast.'
+        return geometry.contains(self._polygon, latitude, longitude)
+
+
+def update_index(index: forecast_index.ForecastIndex, columns: forecast_columns.ForecastColumns,
+                 first: int) -> forecast_index.ForecastIndex:
+    '''
+    Returns the index over columns, updated from the index of an older
+    version of them whose rows before first are the same.
+    '''
+    return index.update({metric: columns.column(metric) for metric in forecast_columns.METRICS}, first)
+
+
+def build_index(columns: forecast_columns.ForecastColumns) -> forecast_index.ForecastIndex:
+    '''
+    Returns the index over every metric of columns, including the feels like
+    temperature of each period.
+    '''
+    return forecast_index.ForecastIndex({
+        metric: columns.column(metric) for metric in forecast_columns.METRICS
+    })
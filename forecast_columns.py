@@ -0,0 +1,178 @@
+'''
+Stores the hourly forecast periods as compact columns instead of the raw
+nested libraries from the geojson. Each column holds one value per period, which
+the forecast index scans with vectorized running max/min calls.
+Uses NumPy arrays when NumPy is installed, and array.array otherwise.
+'''
+import array
+import feels_like
+import instrumentation
+import timestamps
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+METRICS = ('temperature', 'feels', 'humidity', 'wind', 'precipitation')
+
+'The metrics read from every period, which the feels like temperature is computed from'
+_INPUTS = ('temperature', 'humidity', 'wind', 'precipitation')
+
+
+class ForecastColumns:
+    '''
+    Builds one column per metric, plus the start time of each period in
+    seconds since the epoch and its offset from UTC, from an iterable of
+    forecast periods. The start times and the feels like temperatures are
+    computed together once every period has been read.
+    '''
+    def __init__(self, periods):
+        self._days = None
+        inputs, start, offsets = _read_periods(periods)
+        self._columns = {metric: _to_column(inputs[metric]) for metric in _INPUTS}
+        self._columns['feels'] = feels_like.feels_like_column(
+            self._columns['temperature'], self._columns['humidity'], self._columns['wind']
+        )
+        self._start = _to_column(start)
+        self._offsets = _to_column(offsets)
+        instrumentation.count('periods_loaded', len(self._start))
+
+    @classmethod
+    def from_columns(cls, columns: dict, start, offsets = None) -> 'ForecastColumns':
+        '''
+        Returns ForecastColumns over columns that were already built, a
+        library of metric -> column, the column of start times and the column
+        of their offsets from UTC, such as ones read back from a snapshot.
+        Without offsets, days are taken in UTC.
+        '''
+        self = cls.__new__(cls)
+        self._days = None
+        self._columns = columns
+        self._start = start
+        self._offsets = offsets
+        return self
+
+    def update(self, periods) -> tuple:
+        '''
+        Returns (columns, first changed row) for a newer version of the same
+        forecast, such as the next download of its hourly forecast. Rows are
+        matched to these columns by start time, and rows whose inputs haven't
+        changed reuse their feels like temperature, so it is only computed for
+        new and changed rows. The first changed row is the first row that
+        differs from the row at the same position here, everything before it
+        being the same.
+        '''
+        old = {metric: self._columns[metric] for metric in METRICS}
+        columns, start, offsets = _read_periods(periods)
+        columns['feels'] = array.array('d')
+        'The rows here by start time, only needed while matching'
+        rows = {int(epoch): j for j, epoch in enumerate(self._start)}
+        changed = []
+        first = None
+        for i, epoch in enumerate(start):
+            j = rows.get(epoch)
+            same = j is not None and all(_same(old[metric][j], columns[metric][i]) for metric in _INPUTS)
+            if same:
+                columns['feels'].append(old['feels'][j])
+            else:
+                columns['feels'].append(0.0)
+                changed.append(i)
+            if first is None and not (same and j == i):
+                first = i
+        if changed:
+            feels = feels_like.feels_like_column(
+                [columns['temperature'][i] for i in changed],
+                [columns['humidity'][i] for i in changed],
+                [columns['wind'][i] for i in changed]
+            )
+            for i, value in zip(changed, feels):
+                columns['feels'][i] = value
+        if first is None:
+            first = min(len(start), len(self._start))
+        instrumentation.count('periods_updated', len(changed))
+        updated = ForecastColumns.from_columns(
+            {metric: _to_column(columns[metric]) for metric in METRICS}, _to_column(start), _to_column(offsets)
+        )
+        return (updated, first)
+
+    def __len__(self) -> int:
+        return len(self._start)
+
+    def column(self, metric: str):
+        'Returns the column holding the given metric for every period.'
+        return self._columns[metric]
+
+    def get_start(self):
+        'Returns the column of period start times in seconds since the epoch.'
+        return self._start
+
+    def get_offsets(self):
+        'Returns the column of the offsets of the period start times, in seconds east of UTC, or None.'
+        return self._offsets
+
+    def get_days(self) -> list[tuple]:
+        '''
+        Returns (date, first period, end period) of every local day that the
+        periods cover, in order, where the date is like 2024-01-01 and the
+        day's periods are those from first up to but not including end. The
+        days are found the first time they are needed.
+        '''
+        if self._days is None:
+            days = []
+            current = None
+            for i in range(len(self._start)):
+                epoch = int(self._start[i])
+                offset = int(self._offsets[i]) if self._offsets is not None else 0
+                day = (epoch + offset) // 86400
+                if day != current:
+                    days.append([timestamps.format_date(epoch, offset), i, i + 1])
+                    current = day
+                else:
+                    days[-1][2] = i + 1
+            self._days = [tuple(day) for day in days]
+        return self._days
+
+
+def _read_periods(periods) -> tuple:
+    '''
+    Returns (library of input metric -> column, start times in seconds since
+    the epoch, their offsets from UTC) read from an iterable of periods, the
+    columns and times as array.arrays.
+    '''
+    temperature = array.array('d')
+    humidity = array.array('d')
+    wind = array.array('d')
+    precipitation = array.array('d')
+    start_times = []
+    for period in periods:
+        temperature.append(period['temperature'])
+        humidity.append(_value(period['relativeHumidity']))
+        w = period['windSpeed']
+        wind.append(float(w[:w.find(' ')]))
+        precipitation.append(_value(period['probabilityOfPrecipitation']))
+        start_times.append(period['startTime'])
+    offsets = array.array('q')
+    start = timestamps.bulk_to_epoch(start_times, offsets)
+    columns = {'temperature': temperature, 'humidity': humidity, 'wind': wind, 'precipitation': precipitation}
+    return (columns, start, offsets)
+
+
+def _same(a: float, b: float) -> bool:
+    'Returns whether two values are equal, counting two missing values as equal.'
+    return a == b or (a != a and b != b)
+
+
+def _value(quantity: dict) -> float:
+    'Returns the value of a unit/value library, with a missing value as NaN.'
+    value = quantity['value']
+    if value is None:
+        return float('nan')
+    return float(value)
+
+
+def _to_column(values: array.array):
+    'Wraps an array.array in a NumPy array without copying, when available.'
+    if numpy is not None:
+        return numpy.frombuffer(values, dtype = values.typecode)
+    return values
@@ -0,0 +1,314 @@
+'''
+Index over the forecast columns so that max/min queries don't have to scan
+the periods. Stores the running max/min and where it occurs for every metric,
+which answers queries over the first N periods in constant time, and builds a
+sparse table on demand for queries over any [start, end) window of periods.
+Windows of up to SCAN_PERIODS, such as the days of DAILY queries, are
+scanned instead, so they never need the table.
+Averages, sums and percentiles over any window are answered from running
+sums and a wavelet matrix of the ranks of the values, also built on demand.
+'''
+import array
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+'Windows of at most this many periods are scanned instead of looked up in a sparse table'
+SCAN_PERIODS = 32
+
+
+class ForecastIndex:
+    '''
+    Given a library of metric name -> column of per-period values, stores the
+    running max/min index of each column, unless they were already computed
+    and given as prefix, a library of metric name -> 'MAX'/'MIN' -> indexes.
+    Sparse tables for windowed queries, and the rollups for aggregate
+    queries, are only built the first time that metric needs them.
+    '''
+    def __init__(self, columns: dict, prefix: dict | None = None):
+        self._columns = columns
+        self._prefix = {}
+        self._sparse = {}
+        self._sums = {}
+        self._ranks = {}
+        for metric, values in columns.items():
+            if prefix is not None and metric in prefix:
+                self._prefix[metric] = prefix[metric]
+                continue
+            self._prefix[metric] = {
+                'MAX': _running_extreme(values, 'MAX'),
+                'MIN': _running_extreme(values, 'MIN')
+            }
+
+    def prefix(self, metric: str, length: int, limit: str) -> tuple:
+        '''
+        Returns (index, value) of the max/min of metric over the first length
+        periods. Ties keep the earliest period.
+        '''
+        values = self._columns[metric]
+        if length < 1 or length > len(values):
+            raise IndexError('not enough forecast periods')
+        index = int(self._prefix[metric][limit][length - 1])
+        return (index, values[index])
+
+    def update(self, columns: dict, first: int) -> 'ForecastIndex':
+        '''
+        Returns the index over columns, a newer version of the columns of
+        this index whose rows before first haven't changed. The running
+        max/min of those rows is kept and only continued from first.
+        '''
+        prefix = {}
+        for metric, values in columns.items():
+            previous = self._prefix.get(metric)
+            if previous is None:
+                continue
+            prefix[metric] = {
+                limit: _running_extreme(values, limit, previous[limit], first)
+                for limit in ('MAX', 'MIN')
+            }
+        return ForecastIndex(columns, prefix)
+
+    def prefix_indexes(self, metric: str, limit: str):
+        'Returns the index of the max/min of metric over the first i + 1 periods, for every i.'
+        return self._prefix[metric][limit]
+
+    def window(self, metric: str, start: int, end: int, limit: str) -> tuple:
+        '''
+        Returns (index, value) of the max/min of metric over the periods from
+        start up to but not including end. Ties keep the earliest period.
+        '''
+        values = self._columns[metric]
+        if start < 0 or end > len(values) or start >= end:
+            raise IndexError('not enough forecast periods')
+        if start == 0:
+            return self.prefix(metric, end, limit)
+        key = (metric, limit)
+        if end - start <= SCAN_PERIODS and key not in self._sparse:
+            index = start
+            for i in range(start + 1, end):
+                index = _better(values, limit, index, i)
+            return (index, values[index])
+        if key not in self._sparse:
+            self._sparse[key] = _sparse_table(values, limit)
+        table = self._sparse[key]
+        k = (end - start).bit_length() - 1
+        index = _better(values, limit, table[k][start], table[k][end - (1 << k)])
+        return (index, values[index])
+
+
+    def aggregate(self, metric: str, start: int, end: int, kind: str) -> tuple:
+        '''
+        Returns (index, value) of the average ('AVG'), sum ('SUM') or a
+        percentile ('P50', 'P90', ...) of metric over the periods from start
+        up to but not including end, leaving out missing values. The index is
+        start for averages and sums, and the period holding the value for
+        percentiles, which use the nearest rank.
+        '''
+        values = self._columns[metric]
+        if start < 0 or end > len(values) or start >= end:
+            raise IndexError('not enough forecast periods')
+        if metric not in self._sums:
+            self._sums[metric] = _running_sums(values)
+        sums, counts = self._sums[metric]
+        count = int(counts[end] - counts[start])
+        if kind == 'SUM':
+            return (start, float(sums[end] - sums[start]))
+        elif kind == 'AVG':
+            return (start, float(sums[end] - sums[start]) / count if count else float('nan'))
+        if count == 0:
+            return (start, float('nan'))
+        if metric not in self._ranks:
+            self._ranks[metric] = _Ranks(values)
+        k = max(0, math.ceil(int(kind[1:]) / 100 * count) - 1)
+        index = self._ranks[metric].kth(start, end, k)
+        return (index, values[index])
+
+
+class _Ranks:
+    '''
+    Wavelet matrix over the ranks of a column's values, missing values
+    ranking last. Finds the period holding the k-th smallest value of any
+    window with one step per bit of the ranks.
+    '''
+    def __init__(self, values):
+        n = len(values)
+        self._bits = max(1, (n - 1).bit_length())
+        self._ones = []
+        self._zeros = []
+        if numpy is not None:
+            self._order = numpy.argsort(numpy.asarray(values), kind = 'stable')
+            current = numpy.empty(n, dtype = numpy.int64)
+            current[self._order] = numpy.arange(n)
+            for level in range(self._bits):
+                bits = (current >> (self._bits - 1 - level)) & 1
+                self._ones.append(numpy.concatenate(([0], numpy.cumsum(bits))))
+                self._zeros.append(n - int(self._ones[-1][-1]))
+                current = numpy.concatenate((current[bits == 0], current[bits == 1]))
+            return
+        self._order = array.array('q', sorted(range(n), key = lambda i: _rank_key(values[i])))
+        current = array.array('q', bytes(8 * n))
+        for rank, i in enumerate(self._order):
+            current[i] = rank
+        for level in range(self._bits):
+            shift = self._bits - 1 - level
+            ones = array.array('q', [0])
+            zeros = array.array('q')
+            rest = array.array('q')
+            count = 0
+            for rank in current:
+                if (rank >> shift) & 1:
+                    count += 1
+                    rest.append(rank)
+                else:
+                    zeros.append(rank)
+                ones.append(count)
+            self._ones.append(ones)
+            self._zeros.append(len(zeros))
+            current = zeros + rest
+
+    def kth(self, start: int, end: int, k: int) -> int:
+        'Returns the index of the period holding the k-th smallest value, from 0, of values[start:end].'
+        rank = 0
+        for level in range(self._bits):
+            ones = self._ones[level]
+            ones_start = int(ones[start])
+            ones_end = int(ones[end])
+            zeros = (end - start) - (ones_end - ones_start)
+            if k < zeros:
+                start -= ones_start
+                end -= ones_end
+            else:
+                k -= zeros
+                start = self._zeros[level] + ones_start
+                end = self._zeros[level] + ones_end
+                rank |= 1 << (self._bits - 1 - level)
+        return int(self._order[rank])
+
+
+def _rank_key(value: float) -> tuple:
+    'Sorts missing values after every other value.'
+    return (True, 0.0) if value != value else (False, value)
+
+
+def _running_sums(values) -> tuple:
+    '''
+    Returns (sums, counts) where sums[i] is the sum and counts[i] the number
+    of the values before i, leaving out missing values.
+    '''
+    if numpy is not None:
+        v = numpy.asarray(values, dtype = float)
+        present = ~numpy.isnan(v)
+        sums = numpy.concatenate(([0.0], numpy.cumsum(numpy.where(present, v, 0.0))))
+        counts = numpy.concatenate(([0], numpy.cumsum(present)))
+        return (sums, counts)
+    sums = array.array('d', [0.0])
+    counts = array.array('q', [0])
+    total = 0.0
+    count = 0
+    for value in values:
+        if value == value:
+            total += value
+            count += 1
+        sums.append(total)
+        counts.append(count)
+    return (sums, counts)
+
+
+def _running_extreme(values, limit: str, previous = None, first: int = 0):
+    '''
+    Returns the index of the max/min of values[0..i] for every i, keeping the
+    earliest index when values tie and leaving out missing values, unless
+    every value so far is missing. If previous holds the indexes of values
+    that only differ from first on, the indexes before first are copied from
+    it instead of computed again, unless NumPy recomputes them all faster.
+    '''
+    n = len(values)
+    first = min(first, n, len(previous) if previous is not None else 0)
+    if numpy is not None and n > 0:
+        v = numpy.asarray(values, dtype = float)
+        if limit == 'MAX':
+            v = numpy.where(numpy.isnan(v), -numpy.inf, v)
+            running = numpy.maximum.accumulate(v)
+            record = v[1:] > running[:-1]
+        else:
+            v = numpy.where(numpy.isnan(v), numpy.inf, v)
+            running = numpy.minimum.accumulate(v)
+            record = v[1:] < running[:-1]
+        positions = numpy.arange(n)
+        positions[1:][~record] = 0
+        return numpy.maximum.accumulate(positions)
+    if first > 0:
+        indexes = array.array('q', previous[:first])
+        best = indexes[-1]
+    else:
+        indexes = array.array('q')
+        best = 0
+    for i in range(first, n):
+        value = values[i]
+        if value != value:
+            pass
+        elif values[best] != values[best]:
+            best = i
+        elif limit == 'MAX' and value > values[best]:
+            best = i
+        elif limit == 'MIN' and value < values[best]:
+            best = i
+        indexes.append(best)
+    return indexes
+
+
+def _sparse_table(values, limit: str) -> list:
+    '''
+    Returns a list of levels where level k holds, for every i, the index of
+    the max/min of values[i:i + 2 ** k].
+    '''
+    n = len(values)
+    if numpy is not None:
+        v = numpy.asarray(values, dtype = float)
+        missing = numpy.isnan(v)
+        table = [numpy.arange(n)]
+        k = 1
+        while (1 << k) <= n:
+            previous = table[-1]
+            step = 1 << (k - 1)
+            a = previous[:n - (1 << k) + 1]
+            b = previous[step:step + len(a)]
+            'a always comes before b, so b is only taken when it is strictly better, as in _better'
+            if limit == 'MAX':
+                take = v[b] > v[a]
+            else:
+                take = v[b] < v[a]
+            take |= missing[a] & ~missing[b]
+            table.append(numpy.where(take, b, a))
+            k += 1
+        return table
+    table = [array.array('q', range(n))]
+    k = 1
+    while (1 << k) <= n:
+        previous = table[-1]
+        step = 1 << (k - 1)
+        level = array.array('q')
+        for i in range(n - (1 << k) + 1):
+            level.append(_better(values, limit, previous[i], previous[i + step]))
+        table.append(level)
+        k += 1
+    return table
+
+
+def _better(values, limit: str, a: int, b: int) -> int:
+    '''
+    Returns whichever of indexes a and b holds the max/min, preferring the
+    earliest. A missing value is worse than any other value.
+    '''
+    if values[b] != values[b]:
+        return a if values[a] == values[a] else min(a, b)
+    if values[a] != values[a]:
+        return b
+    if values[a] == values[b]:
+        return min(a, b)
+    if limit == 'MAX':
+        return a if values[a] > values[b] else b
+    return a if values[a] < values[b] else b
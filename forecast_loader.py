@@ -0,0 +1,281 @@
+'''
+Streaming loader for forecast files. Instead of building the whole geojson
+tree with json.load, it scans the file incrementally and only decodes the
+parts the queries need: each period inside 'properties' -> 'periods', one at
+a time, and the polygon inside 'geometry' -> 'coordinates'. Everything else is
+skipped without being decoded, so memory stays bounded by the size of a
+single period no matter how large the file is. The file can be read in chunks
+or through mmap, and a payload already in memory can be read the same way.
+
+Skipped values are only checked for balanced brackets and strings, not fully
+validated.
+'''
+import codecs
+import io
+import json
+import mmap
+import re
+from collections.abc import Iterator
+import forecast_columns
+
+CHUNK_SIZE = 256 * 1024
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+_STRUCTURE = re.compile(r'["{}\[\]]')
+_STRING_END = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r'[,}\]\s]')
+
+
+def load_forecast(file: str, use_mmap: bool = False) -> tuple:
+    '''
+    Returns (polygon, columns) from the forecast file, where polygon is the
+    first ring of 'geometry' -> 'coordinates' and columns is a
+    ForecastColumns of the periods. Raises JSONDecodeError if the file isn't
+    json, and KeyError if either part is missing.
+    '''
+    with open(file, 'rb') as f:
+        return _read(_Reader(f, use_mmap), forecast_columns.ForecastColumns)
+
+
+def read_forecast(data: bytes) -> tuple:
+    '''
+    Returns (polygon, periods) from a forecast payload in memory, where
+    periods is the list of decoded periods and everything else is skipped.
+    Raises the same errors as load_forecast.
+    '''
+    return _read(_Reader(io.BytesIO(data), False), list)
+
+
+def _read(reader, build) -> tuple:
+    'Returns (polygon, build(periods)) from the forecast at reader, closing it.'
+    try:
+        polygon = None
+        periods = None
+        for key in reader.iter_object():
+            if key == 'geometry':
+                for inner in reader.iter_object():
+                    if inner == 'coordinates':
+                        polygon = reader.read_value()[0]
+                    else:
+                        reader.skip_value()
+            elif key == 'properties':
+                for inner in reader.iter_object():
+                    if inner == 'periods':
+                        periods = build(_iter_periods(reader))
+                    else:
+                        reader.skip_value()
+            else:
+                reader.skip_value()
+        reader.expect_end()
+    finally:
+        reader.close()
+    if polygon is None:
+        raise KeyError('geometry')
+    if periods is None:
+        raise KeyError('periods')
+    return (polygon, periods)
+
+
+def _iter_periods(reader) -> Iterator[dict]:
+    'Yields every period of the array at the reader, decoded one at a time.'
+    for i in reader.iter_array():
+        yield reader.read_value()
+
+
+class _Reader:
+    '''
+    Reads json tokens from a file, or from an mmap of it, by decoding it into
+    a text buffer one chunk at a time. Only the text from the current
+    position, or from the start of the value being decoded, is kept.
+    '''
+    def __init__(self, f, use_mmap: bool):
+        self._map = None
+        if use_mmap:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            except ValueError:
+                'Empty files can\'t be mapped'
+                self._map = None
+        self._source = self._map if self._map is not None else f
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._eof = False
+        self._mark = None
+        self.buf = ''
+        self.pos = 0
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+
+    def iter_object(self) -> Iterator[str]:
+        '''
+        Yields every key of the object at the reader. The caller has to read
+        or skip the key's value before asking for the next key.
+        '''
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                self._fail('Expecting property name enclosed in double quotes')
+            key = self.read_value()
+            self._expect(':')
+            yield key
+            if not self._next_item('}'):
+                return
+
+    def iter_array(self) -> Iterator[int]:
+        '''
+        Yields the index of every element of the array at the reader. The
+        caller has to read or skip each element before asking for the next.
+        '''
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        i = 0
+        while True:
+            yield i
+            i += 1
+            if not self._next_item(']'):
+                return
+
+    def read_value(self):
+        '''
+        Returns the decoded value at the reader, moving past it. A value cut
+        off by the end of the buffer is decoded again once more is read.
+        '''
+        self._peek()
+        self._mark = self.pos
+        try:
+            while True:
+                try:
+                    value, end = _DECODER.raw_decode(self.buf, self.pos)
+                except json.JSONDecodeError as err:
+                    if self._fill():
+                        continue
+                    self._fail(err.msg)
+                if end == len(self.buf) and self._fill():
+                    'A number may continue in the next chunk'
+                    continue
+                self.pos = end
+                return value
+        finally:
+            self._mark = None
+
+    def skip_value(self) -> None:
+        'Moves past the value at the reader without decoding it.'
+        c = self._peek()
+        if c == '"':
+            self._skip_string()
+        elif c == '{' or c == '[':
+            self._skip_container()
+        else:
+            while True:
+                match = _SCALAR_END.search(self.buf, self.pos + 1)
+                if match is not None:
+                    self.pos = match.start()
+                    return
+                if not self._fill():
+                    self.pos = len(self.buf)
+                    return
+
+    def expect_end(self) -> None:
+        'Raises JSONDecodeError if there is anything but whitespace left.'
+        if self._skip_whitespace():
+            self._fail('Extra data')
+
+    def _skip_string(self) -> None:
+        'Moves past the string starting at the reader.'
+        self.pos += 1
+        while True:
+            match = _STRING_END.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    self._fail('Unterminated string')
+                continue
+            if self.buf[match.start()] == '"':
+                self.pos = match.end()
+                return
+            'Skips the escaped character'
+            self.pos = match.end() + 1
+            while self.pos > len(self.buf) and self._fill():
+                pass
+
+    def _skip_container(self) -> None:
+        'Moves past the object or array starting at the reader.'
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    self._fail('Unterminated object or array')
+                continue
+            self.pos = match.start()
+            c = self.buf[self.pos]
+            if c == '"':
+                self._skip_string()
+                continue
+            self.pos += 1
+            if c == '{' or c == '[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _next_item(self, close: str) -> bool:
+        'Moves past the "," before the next item, or the closing bracket. Returns False at the end.'
+        c = self._peek()
+        if c == ',':
+            self.pos += 1
+            return True
+        if c != close:
+            self._fail("Expecting ',' delimiter")
+        self.pos += 1
+        return False
+
+    def _expect(self, token: str) -> None:
+        if self._peek() != token:
+            self._fail(f"Expecting '{token}'")
+        self.pos += 1
+
+    def _peek(self) -> str:
+        'Returns the next character that isn\'t whitespace, without moving past it.'
+        if not self._skip_whitespace():
+            self._fail('Expecting value')
+        return self.buf[self.pos]
+
+    def _skip_whitespace(self) -> bool:
+        'Moves past whitespace, returning False if the end of the file is reached.'
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return True
+            if not self._fill():
+                return False
+
+    def _fill(self) -> bool:
+        '''
+        Decodes the next chunk of the file into the buffer, dropping text that
+        is no longer needed. Returns False at the end of the file.
+        '''
+        if self._eof:
+            return False
+        chunk = self._source.read(CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+        text = self._decoder.decode(chunk, final = self._eof)
+        keep = min(len(self.buf), self.pos if self._mark is None else self._mark)
+        self.buf = self.buf[keep:] + text
+        self.pos -= keep
+        if self._mark is not None:
+            self._mark -= keep
+        return not self._eof or len(text) > 0
+
+    def _fail(self, message: str) -> None:
+        raise json.JSONDecodeError(message, '', self.pos)
@@ -0,0 +1,187 @@
+'''
+Binary snapshots of parsed forecasts, so a forecast file is only parsed from
+json once. A snapshot is a fixed-width columnar layout: a header, a json
+metadata block holding the table of metric names, the polygon as pairs of
+doubles, then for every metric its column of doubles followed by its running
+max/min indexes, and finally the start times and their offsets from UTC. Every section is 8-byte aligned
+so a snapshot reopened through mmap serves its columns and index without
+copying them, as NumPy arrays when NumPy is installed and memoryviews
+otherwise.
+
+Snapshots record the modification time and size of the json file they were
+made from, and are only used while those still match. They are kept under
+SNAPSHOT_DIRECTORY, named after the hash of the json file's path, and the
+least recently used are removed once the directory grows past MAX_BYTES.
+Files under MIN_SOURCE_BYTES aren't worth a snapshot, since parsing them
+takes about as long as writing one.
+
+    python forecast_snapshot.py FILE [FILE ...]
+'''
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import forecast
+import forecast_columns
+import forecast_index
+import json_decoder
+import persistent_store
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SNAPSHOT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'weatherapi', 'snapshots')
+MAX_BYTES = 256 * 1024 * 1024
+MIN_SOURCE_BYTES = 256 * 1024
+MAGIC = b'WXSNAP\r\n'
+VERSION = 2
+
+'magic, version, reserved, periods, polygon vertices, source mtime, source size, metadata bytes'
+_HEADER = struct.Struct('<8sIIqqqqq')
+_LIMITS = ('MAX', 'MIN')
+
+'The size limit of every directory snapshots were written to, as (directory, max bytes) -> SizeLimit'
+_size_limits = {}
+_size_limits_lock = threading.Lock()
+
+
+def snapshot_path(file: str, directory: str | None = None) -> str:
+    'Returns where the snapshot of the json forecast file is kept, under SNAPSHOT_DIRECTORY by default.'
+    name = hashlib.sha256(os.path.abspath(file).encode('utf-8')).hexdigest()
+    return os.path.join(directory or SNAPSHOT_DIRECTORY, name + '.snap')
+
+
+def write_snapshot(path: str, polygon: list, columns: forecast_columns.ForecastColumns,
+                   index: forecast_index.ForecastIndex, source_stat: os.stat_result,
+                   max_bytes: int = MAX_BYTES) -> None:
+    '''
+    Writes the snapshot of a parsed forecast made from the json file with
+    source_stat to path, replacing it atomically, then removes the least
+    recently used snapshots beside it past max_bytes. Snapshots are
+    little-endian, so nothing is written on big-endian machines.
+    '''
+    if sys.byteorder != 'little':
+        return
+    metadata = json.dumps({'metrics': list(forecast_columns.METRICS)}).encode('utf-8')
+    vertices = [float(value) for coordinate in polygon for value in coordinate[:2]]
+    sections = [
+        _HEADER.pack(MAGIC, VERSION, 0, len(columns), len(vertices) // 2,
+                     source_stat.st_mtime_ns, source_stat.st_size, len(metadata)),
+        _pad(metadata),
+        struct.pack(f'<{len(vertices)}d', *vertices)
+    ]
+    for metric in forecast_columns.METRICS:
+        sections.append(_to_bytes(columns.column(metric), 'd'))
+        for limit in _LIMITS:
+            sections.append(_to_bytes(index.prefix_indexes(metric, limit), 'q'))
+    sections.append(_to_bytes(columns.get_start(), 'q'))
+    offsets = columns.get_offsets()
+    sections.append(_to_bytes(offsets if offsets is not None else [0] * len(columns), 'q'))
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok = True)
+    previous = persistent_store.file_size(path)
+    persistent_store.write_atomic(path, sections)
+    _size_limit(directory, max_bytes).add(sum(len(section) for section in sections), previous)
+
+
+def _size_limit(directory: str, max_bytes: int) -> persistent_store.SizeLimit:
+    'Returns the size limit of the snapshots in directory, the modification time of each recording when it was last read.'
+    with _size_limits_lock:
+        key = (os.path.abspath(directory), max_bytes)
+        if key not in _size_limits:
+            _size_limits[key] = persistent_store.SizeLimit(directory, '.snap', max_bytes)
+        return _size_limits[key]
+
+
+def read_snapshot(path: str, source_stat: os.stat_result | None = None) -> tuple | None:
+    '''
+    Returns (polygon, columns, index) from the snapshot at path through mmap,
+    or None if there is no valid snapshot there, or, when source_stat is
+    given, if it was made from a different version of the json file.
+    '''
+    if sys.byteorder != 'little':
+        return None
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < _HEADER.size:
+        return None
+    magic, version, _, periods, vertices, mtime_ns, size, metadata_length = _HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != VERSION:
+        return None
+    if source_stat is not None and (mtime_ns, size) != (source_stat.st_mtime_ns, source_stat.st_size):
+        return None
+    offset = _HEADER.size + _padded(metadata_length)
+    expected = offset + 16 * vertices + 8 * periods * (3 * len(forecast_columns.METRICS) + 2)
+    if len(mapped) != expected:
+        return None
+    try:
+        metadata = json.loads(bytes(mapped[_HEADER.size:_HEADER.size + metadata_length]))
+    except ValueError:
+        return None
+    if metadata.get('metrics') != list(forecast_columns.METRICS):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    flat = struct.unpack_from(f'<{2 * vertices}d', mapped, offset)
+    polygon = [[flat[i], flat[i + 1]] for i in range(0, len(flat), 2)]
+    offset += 16 * vertices
+    values = {}
+    prefix = {}
+    for metric in forecast_columns.METRICS:
+        values[metric], offset = _view(mapped, offset, periods, 'd')
+        prefix[metric] = {}
+        for limit in _LIMITS:
+            prefix[metric][limit], offset = _view(mapped, offset, periods, 'q')
+    start, offset = _view(mapped, offset, periods, 'q')
+    offsets, offset = _view(mapped, offset, periods, 'q')
+    columns = forecast_columns.ForecastColumns.from_columns(values, start, offsets)
+    return (polygon, columns, forecast_index.ForecastIndex(values, prefix))
+
+
+def _view(mapped: mmap.mmap, offset: int, count: int, typecode: str) -> tuple:
+    'Returns (column of count values at offset without copying, offset after it).'
+    end = offset + 8 * count
+    if numpy is not None:
+        column = numpy.frombuffer(mapped, dtype = '<f8' if typecode == 'd' else '<i8', count = count, offset = offset)
+    else:
+        column = memoryview(mapped)[offset:end].cast(typecode)
+    return (column, end)
+
+
+def _to_bytes(values, typecode: str) -> bytes:
+    'Returns the column as little-endian doubles or 64-bit integers.'
+    if numpy is not None:
+        return numpy.asarray(values, dtype = '<f8' if typecode == 'd' else '<i8').tobytes()
+    if getattr(values, 'typecode', None) == typecode:
+        return values.tobytes()
+    return struct.pack(f'<{len(values)}{typecode}', *values)
+
+
+def _padded(length: int) -> int:
+    return (length + 7) // 8 * 8
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b'\0' * (_padded(len(data)) - len(data))
+
+
+def main(argv: list[str]) -> None:
+    'Writes a fresh snapshot of every json forecast file given, such as a whole archive.'
+    for file in argv:
+        stat = os.stat(file)
+        polygon, columns = json_decoder.load_forecast(file)
+        write_snapshot(snapshot_path(file), polygon, columns, forecast.build_index(columns), stat)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
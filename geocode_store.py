@@ -0,0 +1,213 @@
+'''
+Local store of geocoding answers, so Nominatim, which allows one request a
+second, is only asked about places and points it hasn't answered yet.
+Forward lookups are kept as normalized search -> coordinates, and every
+reverse geocoded point is kept with its display name in a grid of buckets,
+so a REVERSE NOMINATIM for a point within RADIUS_KM of a known point is
+answered by the nearest one without a request. Both are kept on disk so
+they survive between runs, each up to a bounded number of entries, dropping
+the least recently used, and written back in batches as they change.
+
+The store can be preloaded from Nominatim json, in the format TargetFile
+and ReverseFile read or the geojson the API returns:
+
+    python geocode_store.py FILE [FILE ...] [--query SEARCH]
+'''
+import argparse
+import collections
+import json
+import math
+import os
+import json_decoder
+import persistent_store
+
+STORE_FILE = os.path.join(persistent_store.STORE_DIRECTORY, 'geocode.json')
+RADIUS_KM = 0.5
+MAX_PLACES = 10000
+MAX_POINTS = 10000
+
+'Kilometers per degree of latitude'
+KM_PER_DEGREE = 111.2
+
+
+class GeocodeStore(persistent_store.PersistentStore):
+    '''
+    Stores the library of normalized search -> [latitude, longitude] and the
+    reverse geocoded points as [latitude, longitude, display name] in the
+    json file at path. Points are filed under grid buckets radius_km wide,
+    so only the buckets around a point are searched.
+    '''
+    def __init__(self, path: str | None = STORE_FILE, radius_km: float = RADIUS_KM,
+                 max_places: int = MAX_PLACES, max_points: int = MAX_POINTS):
+        super().__init__(path)
+        self._radius_km = radius_km
+        self._size = max(radius_km, 0.001) / KM_PER_DEGREE
+        self._max_places = max_places
+        self._max_points = max_points
+        self._places = collections.OrderedDict()
+        self._points = collections.OrderedDict()
+        self._buckets = {}
+        self._load()
+
+    def find_place(self, search: str) -> tuple | None:
+        'Returns (latitude, longitude) of a search already geocoded, or None.'
+        key = normalize(search)
+        with self._lock:
+            coordinates = self._places.get(key)
+            if coordinates is None:
+                return None
+            self._places.move_to_end(key)
+            return tuple(coordinates)
+
+    def find_name(self, latitude: float, longitude: float) -> str | None:
+        '''
+        Returns the display name of the nearest known point within the radius
+        of the coordinates, or None if there is none.
+        '''
+        with self._lock:
+            nearest = None
+            best = self._radius_km
+            row, column = self._bucket(latitude, longitude)
+            span = self._longitude_span(latitude)
+            for r in range(row - 1, row + 2):
+                for c in range(column - span, column + span + 1):
+                    for key in self._buckets.get((r, c), ()):
+                        distance = _distance_km(latitude, longitude, key[0], key[1])
+                        if distance <= best:
+                            nearest = key
+                            best = distance
+            if nearest is None:
+                return None
+            self._points.move_to_end(nearest)
+            return self._points[nearest]
+
+    def remember_place(self, search: str, latitude: float, longitude: float) -> None:
+        'Records the coordinates a search was geocoded to.'
+        with self._lock:
+            self._add_place(normalize(search), latitude, longitude)
+        self._save_if_due()
+
+    def remember_name(self, latitude: float, longitude: float, display_name: str) -> None:
+        'Records the display name the coordinates were reverse geocoded to.'
+        with self._lock:
+            self._add_point(latitude, longitude, display_name)
+        self._save_if_due()
+
+    def preload(self, info, search: str | None = None) -> int:
+        '''
+        Adds every point with a display name in Nominatim json, either a
+        place or list of places like TargetFile and ReverseFile read, or the
+        geojson the API returns, and saves the store. If search is given, it
+        is also recorded as geocoded to the first place. Returns how many
+        places were added.
+        '''
+        places = list(_places_of(info))
+        with self._lock:
+            for latitude, longitude, display_name in places:
+                self._add_point(latitude, longitude, display_name)
+            if search is not None and places:
+                self._add_place(normalize(search), places[0][0], places[0][1])
+        self.flush()
+        return len(places)
+
+    def _add_place(self, key: str, latitude: float, longitude: float) -> None:
+        if self._places.get(key) != [latitude, longitude]:
+            self._places[key] = [latitude, longitude]
+            self._dirty = True
+        self._places.move_to_end(key)
+        while len(self._places) > self._max_places:
+            self._places.popitem(last = False)
+
+    def _add_point(self, latitude: float, longitude: float, display_name: str) -> None:
+        key = (latitude, longitude)
+        if key not in self._points:
+            self._buckets.setdefault(self._bucket(latitude, longitude), []).append(key)
+        if self._points.get(key) != display_name:
+            self._points[key] = display_name
+            self._dirty = True
+        self._points.move_to_end(key)
+        while len(self._points) > self._max_points:
+            oldest, _ = self._points.popitem(last = False)
+            bucket = self._bucket(*oldest)
+            self._buckets[bucket].remove(oldest)
+            if not self._buckets[bucket]:
+                del self._buckets[bucket]
+
+    def _bucket(self, latitude: float, longitude: float) -> tuple:
+        return (math.floor(latitude / self._size), math.floor(longitude / self._size))
+
+    def _longitude_span(self, latitude: float) -> int:
+        'Returns how many buckets of longitude the radius spans at a latitude.'
+        return math.ceil(1 / max(math.cos(math.radians(min(abs(latitude) + self._size, 90.0))), 0.01))
+
+    def _dumps(self) -> str:
+        return json.dumps({
+            'places': self._places,
+            'points': [[latitude, longitude, name] for (latitude, longitude), name in self._points.items()]
+        })
+
+    def _restore(self, info: dict) -> None:
+        for key, (latitude, longitude) in info['places'].items():
+            self._add_place(key, float(latitude), float(longitude))
+        for latitude, longitude, display_name in info['points']:
+            self._add_point(float(latitude), float(longitude), display_name)
+        self._dirty = False
+
+    def _clear(self) -> None:
+        self._places.clear()
+        self._points.clear()
+        self._buckets.clear()
+        self._dirty = False
+
+
+_default_store = persistent_store.DefaultStore(GeocodeStore)
+
+
+def get_default_store() -> GeocodeStore:
+    'Returns the store shared by TargetNominatim and ReverseNominatim, stored in STORE_FILE.'
+    return _default_store.get()
+
+
+def set_default_store(store: GeocodeStore | None) -> None:
+    'Replaces the shared store, or resets it to one stored in STORE_FILE with None.'
+    _default_store.set(store)
+
+
+def normalize(search: str) -> str:
+    'Returns a search with case and runs of whitespace ignored, so equal searches share an entry.'
+    return ' '.join(search.casefold().split())
+
+
+def _places_of(info):
+    'Yields (latitude, longitude, display name) of every place in Nominatim json.'
+    if isinstance(info, dict) and 'features' in info:
+        for feature in info['features']:
+            longitude, latitude = feature['geometry']['coordinates'][:2]
+            yield (float(latitude), float(longitude), feature['properties']['display_name'])
+        return
+    for place in info if isinstance(info, list) else [info]:
+        yield (float(place['lat']), float(place['lon']), place['display_name'])
+
+
+def _distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    'Returns the great circle distance between two coordinates.'
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371.0 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description = 'Preload the geocode store from Nominatim json files.')
+    parser.add_argument('files', nargs = '+', help = 'Nominatim json or geojson files')
+    parser.add_argument('--query', help = 'search that the first place of every file answers')
+    args = parser.parse_args(argv)
+    store = get_default_store()
+    for file in args.files:
+        added = store.preload(json_decoder.load_file(file), args.query)
+        print(f'{file}: {added} places')
+
+
+if __name__ == '__main__':
+    main()
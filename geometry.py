@@ -0,0 +1,89 @@
+'''
+Geometry of the forecast grid cell polygons given by the National Weather
+Service, as lists of [longitude, latitude] coordinates. Shared by both weather
+classes: the center used for reverse geocoding, an area-weighted centroid,
+a point-in-polygon test and a cache of the bounding box of every grid cell.
+'''
+import threading
+
+MAX_BOUNDING_BOXES = 65536
+
+_bounding_boxes = {}
+_bounding_boxes_lock = threading.Lock()
+
+
+def distinct_center(polygon: list) -> tuple:
+    '''
+    Returns (latitude, longitude) as the average of the distinct latitudes and
+    the average of the distinct longitudes of the polygon. Duplicates are
+    dropped with a hash table in linear time, in order of first appearance.
+    '''
+    latitudes = dict.fromkeys(coordinate[1] for coordinate in polygon)
+    longitudes = dict.fromkeys(coordinate[0] for coordinate in polygon)
+    return (sum(latitudes) / len(latitudes), sum(longitudes) / len(longitudes))
+
+
+def area_centroid(polygon: list) -> tuple:
+    '''
+    Returns (latitude, longitude) of the area-weighted centroid of the
+    polygon, treating coordinates as planar, which is accurate for grid cell
+    sized polygons. Falls back to distinct_center if the polygon has no area.
+    '''
+    area = 0.0
+    x_total = 0.0
+    y_total = 0.0
+    n = len(polygon)
+    for i in range(n):
+        x0, y0 = polygon[i][0], polygon[i][1]
+        x1, y1 = polygon[(i + 1) % n][0], polygon[(i + 1) % n][1]
+        cross = x0 * y1 - x1 * y0
+        area += cross
+        x_total += (x0 + x1) * cross
+        y_total += (y0 + y1) * cross
+    if area == 0:
+        return distinct_center(polygon)
+    return (y_total / (3 * area), x_total / (3 * area))
+
+
+def bounding_box(polygon: list, cell: str | None = None) -> tuple:
+    '''
+    Returns (min latitude, min longitude, max latitude, max longitude) of the
+    polygon. If cell names the grid cell, such as 'LOX/154,44', the box is
+    cached so it is only computed once per cell.
+    '''
+    if cell is not None:
+        with _bounding_boxes_lock:
+            box = _bounding_boxes.get(cell)
+        if box is not None:
+            return box
+    latitudes = [coordinate[1] for coordinate in polygon]
+    longitudes = [coordinate[0] for coordinate in polygon]
+    box = (min(latitudes), min(longitudes), max(latitudes), max(longitudes))
+    if cell is not None:
+        with _bounding_boxes_lock:
+            if len(_bounding_boxes) >= MAX_BOUNDING_BOXES:
+                _bounding_boxes.clear()
+            _bounding_boxes[cell] = box
+    return box
+
+
+def contains(polygon: list, latitude: float, longitude: float, cell: str | None = None) -> bool:
+    '''
+    Returns whether the point is inside the polygon, by counting how many
+    edges a ray from the point crosses. Points outside the bounding box are
+    rejected without looking at the edges.
+    '''
+    min_lat, min_lon, max_lat, max_lon = bounding_box(polygon, cell)
+    if not (min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon):
+        return False
+    inside = False
+    n = len(polygon)
+    j = n - 1
+    for i in range(n):
+        xi, yi = polygon[i][0], polygon[i][1]
+        xj, yj = polygon[j][0], polygon[j][1]
+        if (yi > latitude) != (yj > latitude):
+            if longitude < (xj - xi) * (latitude - yi) / (yj - yi) + xi:
+                inside = not inside
+        j = i
+    return inside
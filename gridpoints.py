@@ -0,0 +1,169 @@
+'''
+Shares hourly forecasts between targets that fall in the same National
+Weather Service grid cell. Remembers which grid cell, such as 'LOX/154,44',
+every looked up coordinate belongs to, along with the cell's polygon and
+hourly forecast url, on disk so it survives between runs, up to MAX_CELLS
+cells, dropping the least recently used. A coordinate that was already
+looked up, or that falls inside a known cell's polygon, skips the /points
+request entirely. Parsed forecasts are kept in memory per grid cell,
+so targets in the same cell share one fetch and one set of columns, and an
+expired forecast is kept to be refreshed from instead of rebuilt.
+'''
+import collections
+import json
+import math
+import os
+import time
+import geometry
+import http_cache
+import persistent_store
+
+INDEX_FILE = os.path.join(persistent_store.STORE_DIRECTORY, 'gridpoints.json')
+MAX_CELLS = 10000
+MAX_FORECASTS = 256
+
+
+class GridpointIndex(persistent_store.PersistentStore):
+    '''
+    Stores the library of grid cell -> {'url', 'polygon'} and the library of
+    rounded coordinate -> grid cell in the json file at path. Polygons are
+    also filed under every whole degree of latitude/longitude their bounding
+    box touches, so only nearby cells are tested. Parsed forecasts are kept
+    in memory for ttl seconds.
+    '''
+    def __init__(self, path: str | None = INDEX_FILE, ttl: float = http_cache.FORECAST_TTL,
+                 max_cells: int = MAX_CELLS):
+        super().__init__(path)
+        self._ttl = ttl
+        self._max_cells = max_cells
+        self._cells = collections.OrderedDict()
+        self._points = {}
+        self._cell_points = {}
+        self._buckets = {}
+        self._forecasts = {}
+        self._load()
+
+    def find_grid(self, latitude: float, longitude: float) -> tuple | None:
+        '''
+        Returns (grid cell, hourly forecast url) of the cell containing the
+        coordinates, or None if no known cell contains them.
+        '''
+        with self._lock:
+            cell = self._points.get(_point_key(latitude, longitude))
+            if cell is None:
+                for candidate in self._buckets.get((math.floor(latitude), math.floor(longitude)), ()):
+                    polygon = self._cells[candidate]['polygon']
+                    if geometry.contains(polygon, latitude, longitude, candidate):
+                        cell = candidate
+                        break
+            if cell is None:
+                return None
+            self._cells.move_to_end(cell)
+            return (cell, self._cells[cell]['url'])
+
+    def remember(self, latitude: float, longitude: float, cell: str, url: str, polygon: list) -> None:
+        'Records that the coordinates are in cell, whose forecast is at url.'
+        with self._lock:
+            if cell not in self._cells:
+                self._add_cell(cell, url, polygon)
+                self._dirty = True
+            elif self._cells[cell]['url'] != url:
+                self._cells[cell]['url'] = url
+                self._dirty = True
+            self._cells.move_to_end(cell)
+            if self._add_point(_point_key(latitude, longitude), cell):
+                self._dirty = True
+            while len(self._cells) > self._max_cells:
+                self._remove_cell(next(iter(self._cells)))
+        self._save_if_due()
+
+    def get_forecast(self, cell: str, stale: bool = False):
+        '''
+        Returns the parsed forecast stored for cell, or None if there is none
+        or it is too old. Forecasts that are too old are still returned if
+        stale, to be refreshed from.
+        '''
+        with self._lock:
+            entry = self._forecasts.get(cell)
+            if entry is None or (not stale and time.monotonic() - entry[0] > self._ttl):
+                return None
+            return entry[1]
+
+    def put_forecast(self, cell: str, forecast) -> None:
+        'Stores the parsed forecast of cell, dropping the oldest once there are too many.'
+        with self._lock:
+            if cell not in self._forecasts and len(self._forecasts) >= MAX_FORECASTS:
+                oldest = min(self._forecasts, key = lambda key: self._forecasts[key][0])
+                del self._forecasts[oldest]
+            self._forecasts[cell] = (time.monotonic(), forecast)
+
+    def _add_cell(self, cell: str, url: str, polygon: list) -> None:
+        self._cells[cell] = {'url': url, 'polygon': polygon}
+        self._cell_points[cell] = set()
+        for bucket in self._cell_buckets(cell, polygon):
+            self._buckets.setdefault(bucket, []).append(cell)
+
+    def _remove_cell(self, cell: str) -> None:
+        'Forgets cell along with every coordinate looked up in it.'
+        entry = self._cells.pop(cell)
+        for key in self._cell_points.pop(cell):
+            del self._points[key]
+        for bucket in self._cell_buckets(cell, entry['polygon']):
+            self._buckets[bucket].remove(cell)
+            if not self._buckets[bucket]:
+                del self._buckets[bucket]
+
+    def _add_point(self, key: str, cell: str) -> bool:
+        'Records that the coordinates key are in cell, returning whether that is new.'
+        previous = self._points.get(key)
+        if previous == cell:
+            return False
+        if previous is not None:
+            self._cell_points[previous].discard(key)
+        self._points[key] = cell
+        self._cell_points[cell].add(key)
+        return True
+
+    def _cell_buckets(self, cell: str, polygon: list):
+        'Yields every whole degree of latitude/longitude the bounding box of the polygon of cell touches.'
+        min_lat, min_lon, max_lat, max_lon = geometry.bounding_box(polygon, cell)
+        for lat in range(math.floor(min_lat), math.floor(max_lat) + 1):
+            for lon in range(math.floor(min_lon), math.floor(max_lon) + 1):
+                yield (lat, lon)
+
+    def _restore(self, info: dict) -> None:
+        'Reads the index back, its cells being saved from least to most recently used.'
+        for cell, entry in info['cells'].items():
+            self._add_cell(cell, entry['url'], entry['polygon'])
+        for key, cell in info['points'].items():
+            if cell in self._cells:
+                self._add_point(key, cell)
+        while len(self._cells) > self._max_cells:
+            self._remove_cell(next(iter(self._cells)))
+
+    def _clear(self) -> None:
+        self._cells = collections.OrderedDict()
+        self._points = {}
+        self._cell_points = {}
+        self._buckets = {}
+
+    def _dumps(self) -> str:
+        return json.dumps({'cells': self._cells, 'points': self._points})
+
+
+_default_index = persistent_store.DefaultStore(GridpointIndex)
+
+
+def get_default_index() -> GridpointIndex:
+    'Returns the index shared by every WeatherNominatim, stored in INDEX_FILE.'
+    return _default_index.get()
+
+
+def set_default_index(index: GridpointIndex | None) -> None:
+    'Replaces the shared index, or resets it to one stored in INDEX_FILE with None.'
+    _default_index.set(index)
+
+
+def _point_key(latitude: float, longitude: float) -> str:
+    'Returns the coordinates rounded to 4 decimals, the precision /points uses.'
+    return f'{round(latitude, 4)},{round(longitude, 4)}'
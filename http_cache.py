@@ -0,0 +1,268 @@
+'''
+Disk-backed cache for the responses of the Nominatim and National Weather
+Service APIs, so the same location isn't geocoded and fetched again on every
+run. Each class of endpoint stays fresh for its own amount of time, the
+server's Cache-Control/Expires headers can only shorten that, and stale
+responses with an ETag or Last-Modified are revalidated with a conditional
+request instead of downloaded again. The least recently used responses are
+removed once the cache grows past its size limit.
+'''
+import collections
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+import http_client
+import instrumentation
+import persistent_store
+
+CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'weatherapi')
+MAX_BYTES = 64 * 1024 * 1024
+MEMORY_BYTES = 8 * 1024 * 1024
+
+'Seconds that each class of endpoint stays fresh'
+GEOCODE_TTL = 365 * 24 * 60 * 60
+POINTS_TTL = 3 * 24 * 60 * 60
+FORECAST_TTL = 10 * 60
+
+
+def endpoint_ttl(url: str) -> int:
+    '''
+    Returns how long a response from url stays fresh: geocoding results
+    practically forever, /points metadata for days, and forecasts for minutes.
+    '''
+    path = urllib.parse.urlsplit(url).path
+    if path.startswith('/search') or path.startswith('/reverse'):
+        return GEOCODE_TTL
+    elif path.startswith('/points/'):
+        return POINTS_TTL
+    return FORECAST_TTL
+
+
+def normalize_url(url: str) -> str:
+    '''
+    Returns url with a lowercase scheme and host, no default port and sorted
+    query parameters, so equivalent urls share a cache entry.
+    '''
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = parts.netloc.lower()
+    if (scheme, host[-4:]) == ('https', ':443') or (scheme, host[-3:]) == ('http', ':80'):
+        host = host[:host.rfind(':')]
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values = True)))
+    return urllib.parse.urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+class HTTPCache:
+    '''
+    Stores every cached response as a body file plus a json file of metadata
+    inside directory, named after the hash of the normalized url. The
+    modification time of the body file records when it was last used. The
+    most recently used responses, up to memory_bytes, are also kept in
+    memory so a long-running process doesn't read them from disk again.
+    '''
+    def __init__(self, directory: str = CACHE_DIRECTORY, max_bytes: int = MAX_BYTES,
+                 client: http_client.HTTPClient | None = None, memory_bytes: int = MEMORY_BYTES):
+        self._client = client if client is not None else http_client.get_client()
+        self._directory = directory
+        self._memory_bytes = memory_bytes
+        self._memory = collections.OrderedDict()
+        self._memory_used = 0
+        self._size_limit = persistent_store.SizeLimit(directory, '.body', max_bytes, ('.json',))
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> bytes:
+        '''
+        Returns the body of the response from url, from the cache when it is
+        still fresh, and otherwise from the network through client. Raises
+        the same URLError/HTTPError as urllib.request.urlopen.
+        '''
+        key = self._key(url)
+        now = time.time()
+        meta, body = self._memory_get(key)
+        if meta is None:
+            meta = self._read_meta(key)
+        if meta is not None and meta['expires'] > now:
+            if body is not None:
+                instrumentation.count('cache.memory_hits')
+                return body
+            body = self._read_body(key)
+            if body is not None:
+                instrumentation.count('cache.disk_hits')
+                self._memory_put(key, meta, body)
+                return body
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        response = self._client.request(url, headers)
+        if response.status == 304:
+            if body is None:
+                body = self._read_body(key)
+            if body is None:
+                'The cached body is gone, so it has to be downloaded again'
+                response = self._client.request(url)
+            else:
+                'Not modified, so the cached body is fresh again'
+                instrumentation.count('cache.revalidated')
+                meta['expires'] = now + _freshness(url, response.headers)
+                self._write(key, meta, None)
+                self._memory_put(key, meta, body)
+                return body
+        instrumentation.count('cache.misses')
+        if not _no_store(response.headers):
+            meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'expires': now + _freshness(url, response.headers)
+            }
+            self._write(key, meta, response.body)
+            self._memory_put(key, meta, response.body)
+        return response.body
+
+    def clear(self) -> None:
+        'Removes every cached response.'
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+            for name in self._listdir():
+                _remove(os.path.join(self._directory, name))
+        self._size_limit.reset()
+
+    def _memory_get(self, key: str) -> tuple:
+        'Returns (meta, body) of key from memory, or (None, None) if it isn\'t there.'
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return (None, None)
+            self._memory.move_to_end(key)
+            return entry
+
+    def _memory_put(self, key: str, meta: dict, body: bytes) -> None:
+        'Keeps (meta, body) of key in memory, dropping the least recently used past memory_bytes.'
+        if len(body) > self._memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_used -= len(previous[1])
+            self._memory[key] = (meta, body)
+            self._memory_used += len(body)
+            while self._memory_used > self._memory_bytes:
+                oldest, entry = self._memory.popitem(last = False)
+                self._memory_used -= len(entry[1])
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self._directory, key + extension)
+
+    def _read_meta(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key, '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_body(self, key: str) -> bytes | None:
+        path = self._path(key, '.body')
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return body
+
+    def _write(self, key: str, meta: dict, body: bytes | None) -> None:
+        '''
+        Stores meta, and body when given, replacing the files atomically so
+        concurrent readers never see half a response. Failing to write only
+        means the response isn't cached.
+        '''
+        previous = 0
+        try:
+            os.makedirs(self._directory, exist_ok = True)
+            if body is not None:
+                previous = persistent_store.file_size(self._path(key, '.body'))
+                persistent_store.write_atomic(self._path(key, '.body'), body)
+            persistent_store.write_atomic(self._path(key, '.json'), json.dumps(meta).encode('utf-8'))
+        except OSError:
+            return
+        if body is not None:
+            'Removes the least recently used responses once the cache is past max_bytes'
+            self._size_limit.add(len(body), previous)
+
+    def _listdir(self) -> list:
+        try:
+            return os.listdir(self._directory)
+        except OSError:
+            return []
+
+
+_default_cache = None
+
+
+def set_default_cache(cache: HTTPCache | None) -> None:
+    'Replaces the shared default cache, or resets it to ~/.cache/weatherapi with None.'
+    global _default_cache
+    _default_cache = cache
+
+
+def get(url: str) -> bytes:
+    'Returns the body of the response from url through the shared default cache.'
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HTTPCache()
+    return _default_cache.get(url)
+
+
+def _freshness(url: str, headers) -> float:
+    '''
+    Returns how many seconds a response stays fresh: the endpoint's ttl,
+    shortened by Cache-Control max-age/no-cache or Expires if given.
+    '''
+    ttl = endpoint_ttl(url)
+    cache_control = _cache_control(headers)
+    if 'no-cache' in cache_control:
+        return 0
+    if 'max-age' in cache_control:
+        try:
+            return min(ttl, int(cache_control['max-age']))
+        except ValueError:
+            return 0
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return max(0, min(ttl, email.utils.parsedate_to_datetime(expires).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return 0
+    return ttl
+
+
+def _no_store(headers) -> bool:
+    return 'no-store' in _cache_control(headers)
+
+
+def _cache_control(headers) -> dict:
+    'Returns the Cache-Control directives as a library of name -> value.'
+    directives = {}
+    for directive in (headers.get('Cache-Control') or '').split(','):
+        name, _, value = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
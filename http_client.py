@@ -0,0 +1,240 @@
+'''
+Shared HTTP client for the Nominatim and National Weather Service APIs. Keeps
+a pool of persistent connections for every host so back-to-back requests
+don't pay for a new TCP and TLS handshake, waits for the rate limit of the
+host before every request, asks for gzip/deflate compressed responses,
+follows redirects, and retries failed requests a bounded number of times with
+exponential backoff, or after the time a 429 or 503 response asks for in its
+Retry-After header. Errors, including bodies that fail to decompress, are
+raised as the same URLError and HTTPError that urllib.request.urlopen raises.
+'''
+import calendar
+import email.utils
+import gzip
+import http.client
+import io
+import threading
+import time
+import urllib.error
+import urllib.parse
+import zlib
+import instrumentation
+import rate_limit
+
+TIMEOUT = 10
+RETRIES = 2
+BACKOFF = 0.5
+MAX_CONNECTIONS = 4
+MAX_REDIRECTS = 5
+'Longest Retry-After waited for, past which the response is returned as it is'
+MAX_RETRY_AFTER = 60.0
+USER_AGENT = 'WeatherAPI'
+
+'Status codes worth retrying since the server may answer next time'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+'Retry statuses whose Retry-After header is honored'
+RETRY_AFTER_STATUSES = (429, 503)
+
+
+class Response:
+    '''
+    A fully read response: its status code, its headers (looked up without
+    regard to case) and its decoded body.
+    '''
+    def __init__(self, url: str, status: int, headers, body: bytes):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class HTTPClient:
+    '''
+    Stores idle connections in a library of (scheme, host, port) -> list of
+    connections. A connection is only used by one request at a time, so the
+    client can be shared between threads.
+    '''
+    def __init__(self, timeout: float = TIMEOUT, retries: int = RETRIES,
+                 backoff: float = BACKOFF, max_connections: int = MAX_CONNECTIONS):
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._max_connections = max_connections
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, url: str, headers: dict | None = None) -> Response:
+        '''
+        Sends a GET request to url and returns the response, following
+        redirects. Any status other than 2xx or 304 raises HTTPError, and
+        failing to reach the server raises URLError.
+        '''
+        for redirect in range(MAX_REDIRECTS + 1):
+            response = self._request_with_retries(url, headers)
+            if response.status not in REDIRECT_STATUSES:
+                break
+            location = response.headers.get('Location')
+            if not location:
+                break
+            url = urllib.parse.urljoin(url, location)
+        if response.status != 304 and not 200 <= response.status < 300:
+            raise urllib.error.HTTPError(
+                url, response.status, http.client.responses.get(response.status, ''),
+                response.headers, io.BytesIO(response.body)
+            )
+        return response
+
+    def close(self) -> None:
+        'Closes every idle connection.'
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _request_with_retries(self, url: str, headers: dict | None) -> Response:
+        attempt = 0
+        while True:
+            delay = self._backoff * (2 ** attempt)
+            try:
+                response = self._send(url, headers)
+            except (OSError, http.client.HTTPException) as err:
+                if attempt >= self._retries:
+                    raise err if isinstance(err, urllib.error.URLError) else urllib.error.URLError(err)
+            else:
+                if response.status not in RETRY_STATUSES or attempt >= self._retries:
+                    return response
+                if response.status in RETRY_AFTER_STATUSES:
+                    retry_after = _retry_after(response.headers.get('Retry-After'))
+                    if retry_after is not None:
+                        if retry_after > MAX_RETRY_AFTER:
+                            return response
+                        delay = retry_after
+            instrumentation.count('http.retries')
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, url: str, headers: dict | None) -> Response:
+        '''
+        Sends one request on a pooled connection. A reused connection that the
+        server has already closed is replaced by a new one without counting
+        as a retry.
+        '''
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = {
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        }
+        if headers:
+            request_headers.update(headers)
+        with instrumentation.span('http.rate_limit_wait'):
+            rate_limit.acquire(parts.hostname)
+        connection, reused = self._acquire(key)
+        try:
+            with instrumentation.span('http.request'):
+                try:
+                    connection.request('GET', path, headers = request_headers)
+                    raw = connection.getresponse()
+                except (ConnectionError, http.client.RemoteDisconnected):
+                    if not reused:
+                        raise
+                    connection.close()
+                    connection = self._connect(key)
+                    connection.request('GET', path, headers = request_headers)
+                    raw = connection.getresponse()
+                downloaded = raw.read()
+            body = _decode(downloaded, raw.getheader('Content-Encoding'))
+        except BaseException:
+            connection.close()
+            raise
+        instrumentation.count('http.requests')
+        instrumentation.count('http.bytes_downloaded', len(downloaded))
+        if raw.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return Response(url, raw.status, raw.msg, body)
+
+    def _acquire(self, key: tuple) -> tuple:
+        'Returns (connection, reused) for key, reusing an idle connection if there is one.'
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return (idle.pop(), True)
+        return (self._connect(key), False)
+
+    def _release(self, key: tuple, connection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._max_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _connect(self, key: tuple):
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout = self._timeout)
+        return http.client.HTTPConnection(host, port, timeout = self._timeout)
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> HTTPClient:
+    'Returns the client shared by every api_nominatim class.'
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
+
+
+def request(url: str, headers: dict | None = None) -> Response:
+    'Sends a GET request to url with the shared client.'
+    return get_client().request(url, headers)
+
+
+def _decode(body: bytes, encoding: str | None) -> bytes:
+    '''
+    Returns body with its gzip or deflate content encoding removed. Raises
+    URLError if it can't be decompressed.
+    '''
+    encoding = (encoding or '').strip().lower()
+    try:
+        if encoding == 'gzip':
+            return gzip.decompress(body)
+        elif encoding == 'deflate':
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+    except (OSError, EOFError, zlib.error) as err:
+        raise urllib.error.URLError(f'could not decode {encoding} response: {err}')
+    return body
+
+
+def _retry_after(value: str | None) -> float | None:
+    '''
+    Returns the seconds to wait given by a Retry-After header, either a
+    number of seconds or an HTTP date, or None if there is none or it can't
+    be read.
+    '''
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, calendar.timegm(date.utctimetuple()) - time.time())
@@ -1,6 +1,9 @@
-import weather_nominatim
-import weather_path
-import time
+import sources
+import query_planner
+import instrumentation
+import result_sinks
+import itertools
+from collections.abc import Callable, Iterable, Iterator
 from json.decoder import JSONDecodeError
 from urllib.error import URLError
 from urllib.error import HTTPError
@@ -10,110 +13,155 @@ def run() -> None:
     Gets user inputs for the method of search they want to use, and uses a
     while loop to continuously collect desired queries until requested to stop.
     '''
-    target = input()
-    weather = input()
+    target, weather, list_of_queries, reverse = read_job(input)
+    process_target(target, weather, list_of_queries, reverse)
+
+
+def read_job(next_line: Callable[[], str]) -> tuple:
+    '''
+    Reads one job, a target, a weather source, queries up to and including
+    'NO MORE QUERIES' and a reverse source, calling next_line for every line.
+    next_line raises EOFError at the end of the input, like input does.
+    '''
+    target = next_line()
+    weather = next_line()
     list_of_queries = []
     while True:
-        query = input()
+        query = next_line()
         list_of_queries.append(query)
         if query == 'NO MORE QUERIES':
             break
-    reverse = input()
-    process_target(target, weather, list_of_queries, reverse)
+    reverse = next_line()
+    return (target, weather, list_of_queries, reverse)
 
 
-def process_target(target: str, weather: str, list_of_queries: list[str], reverse: str) -> list[str]:
+def read_jobs(lines: Iterable[str]) -> Iterator[tuple]:
     '''
-    Processes all of the users input. Contains list of desired outputs that prints
-    at the end of the function.
+    Reads every job from lines, such as an open batch file, where jobs are
+    written one after another in the same format as the user input. Blank
+    lines between jobs are skipped. A last job cut off by the end of the
+    input raises EOFError.
     '''
+    lines = (line.rstrip('\r\n') for line in lines)
+    for line in lines:
+        if line.strip() == '':
+            continue
+        rest = itertools.chain([line], lines)
+        yield read_job(lambda: _next_line(rest))
+
+
+def _next_line(lines: Iterator[str]) -> str:
+    'Returns the next line, raising EOFError at the end of the input like input does.'
+    for line in lines:
+        return line
+    raise EOFError('the input ends in the middle of a job')
+
+
+def process_target(target: str, weather: str, list_of_queries: list[str], reverse: str,
+                   sink: result_sinks.ResultSink | None = None) -> list[str]:
+    '''
+    Processes all of the users input, writing the desired outputs to sink at
+    the end of the function, printing them by default. Returns the lines.
+    '''
+    records = evaluate_records(target, weather, list_of_queries, reverse)
+    'Writes results in the order of the list of queries, along with location name and proper credits'
+    if sink is None:
+        sink = result_sinks.TextSink()
+    sink.write(1, records)
+    sink.close()
+    return [line for kind, line in records]
+
+
+def evaluate_target(target: str, weather: str, list_of_queries: list[str], reverse: str) -> list[str]:
+    '''
+    Processes all of the users input. Returns the list of desired outputs, after
+    the lines describing a failure if there was one.
+    '''
+    return [line for kind, line in evaluate_records(target, weather, list_of_queries, reverse)]
+
+
+def evaluate_records(target: str, weather: str, list_of_queries: list[str], reverse: str) -> list[tuple]:
+    '''
+    Processes all of the users input. Returns (kind, line) of every desired
+    output, where kind is one of the kinds in result_sinks. Each stage is
+    timed as a span when instrumentation is enabled.
+    '''
+    with instrumentation.span('job'):
+        records = _evaluate_target(target, weather, list_of_queries, reverse)
+    instrumentation.count('jobs')
+    if records and records[0][0] == result_sinks.FAILURE:
+        instrumentation.count('jobs_failed')
+    return records
+
+
+def _evaluate_target(target: str, weather: str, list_of_queries: list[str], reverse: str) -> list[tuple]:
+    '''
+    The output is kept in sections, joined in order at the end: the failure,
+    the target, the location, the query results and the credits.
+    '''
+    failure = []
+    head = []
+    location = []
     results = []
+    credits = []
     try:
         '''Sets variable t to target object depending on user input, and gets
         latitude and longitude'''
-        if target.startswith('TARGET FILE '):
-            target_file = target[12:]
-            t = weather_path.TargetFile(target_file)
+        with instrumentation.span('job.target'):
+            if target.startswith('TARGET FILE '):
+                target_file = target[12:]
+                t = sources.get_class(sources.TARGET, 'FILE')(target_file)
 
-        elif target.startswith('TARGET NOMINATIM '):
-            target_nominatim = target[17:]
-            t = weather_nominatim.TargetNominatim(target_nominatim)
+            elif target.startswith('TARGET NOMINATIM '):
+                target_nominatim = target[17:]
+                t = sources.get_class(sources.TARGET, 'NOMINATIM')(target_nominatim)
         lat = t.get_latitude()
         lon = t.get_longitude()
-        results.append(f'TARGET {get_lat(lat)} {get_lon(lon)}')
+        head.append((result_sinks.TARGET, f'TARGET {get_lat(lat)} {get_lon(lon)}'))
         '''Sets variable w to weather database object depending on user input,
         creating a polygon variable storing the average polygon coordinates'''
-        if weather.startswith('WEATHER FILE '):
-            weather_file = weather[13:]
-            w = weather_path.WeatherFile(weather_file)
-        elif weather == 'WEATHER NWS':
-            w = weather_nominatim.WeatherNominatim(lat, lon)
+        with instrumentation.span('job.weather'):
+            if weather.startswith('WEATHER FILE '):
+                weather_file = weather[13:]
+                w = sources.get_class(sources.WEATHER, 'FILE')(weather_file)
+            elif weather == 'WEATHER NWS':
+                w = sources.get_class(sources.WEATHER, 'NWS')(lat, lon)
         polygon = w.get_polygon()
-        'Processes every query from the list of queries'
-        for query in list_of_queries:
-            if query.startswith('TEMPERATURE AIR '):
-                x = query.split(' ')
-                x[3] = int(x[3])
-                results.append(w.temperature_air(x[2], x[3], x[4]))
-            elif query.startswith('TEMPERATURE FEELS '):
-                x = query.split(' ')
-                x[3] = int(x[3])
-                results.append(w.temperature_feels(x[2], x[3], x[4]))
-            elif query.startswith('HUMIDITY '):
-                x = query.split(' ')
-                x[1] = int(x[1])
-                results.append(w.humidity(x[1], x[2]))
-            elif query.startswith('WIND '):
-                x = query.split(' ')
-                x[1] = int(x[1])
-                results.append(w.wind(x[1], x[2]))
-            elif query.startswith('PRECIPITATION'):
-                x = query.split(' ')
-                x[1] = int(x[1])
-                results.append(w.precipitation(x[1], x[2]))
+        '''Processes every query from the list of queries, sharing one walk
+        over the forecast per metric'''
+        with instrumentation.span('job.queries'):
+            results.extend((result_sinks.RESULT, line) for line in query_planner.answer_queries(w, list_of_queries))
         '''Sets variable r to reverse object, and reverse searches for a description
         of the closest location to the desired location'''
-        if reverse == 'REVERSE NOMINATIM':
-            'Pauses program for 1 second given the nominatim restriction'
-            if target.startswith('TARGET NOMINATIM '):
-                time.sleep(1)
-            r = weather_nominatim.ReverseNominatim(polygon[0],polygon[1])
-        elif reverse.startswith('REVERSE FILE '):
-            r_file = reverse[13:]
-            r = weather_path.ReverseFile(r_file)
-        results.insert(1, r.get_display_name())
+        with instrumentation.span('job.reverse'):
+            if reverse == 'REVERSE NOMINATIM':
+                'The nominatim restriction is enforced by the rate limit of its host'
+                r = sources.get_class(sources.REVERSE, 'NOMINATIM')(polygon[0],polygon[1])
+            elif reverse.startswith('REVERSE FILE '):
+                r_file = reverse[13:]
+                r = sources.get_class(sources.REVERSE, 'FILE')(r_file)
+            location.append((result_sinks.LOCATION, r.get_display_name()))
         'Credits'
         if target.startswith('TARGET NOMINATIM '):
-            results.append('**Forward geocoding data from OpenStreetMap')
+            credits.append((result_sinks.CREDIT, '**Forward geocoding data from OpenStreetMap'))
         if reverse == 'REVERSE NOMINATIM':
-            results.append('**Reverse geocoding data from OpenStreetMap')
+            credits.append((result_sinks.CREDIT, '**Reverse geocoding data from OpenStreetMap'))
         if weather == 'WEATHER NWS':
-            results.append('**Real-time weather data from National Weather Service, United States Department of Commerce')
+            credits.append((result_sinks.CREDIT, '**Real-time weather data from National Weather Service, United States Department of Commerce'))
     except FileNotFoundError:
         "Can't find file"
-        print('FAILED')
-        print(target_file)
-        print('MISSING')
+        failure = ['FAILED', target_file, 'MISSING']
     except JSONDecodeError as e:
         "File is not json"
-        print('FAILED')
-        print(target_file)
-        print('FORMAT')
+        failure = ['FAILED', target_file, 'FORMAT']
     except URLError:
         "Not connected to the internet"
-        print('FAILED')
-        print(target_nominatim)
-        print('NETWORK')
+        failure = ['FAILED', target_nominatim, 'NETWORK']
     except HTTPError as err:
         "If HTTP status code is not 200"
         if err.code != 200:
-            print('FAILED')
-            print(f'{err.code} {target_nominatim}')
-            print('NOT 200')
-    for i in results:
-        '''Prints results in the order they were stored in in the list of queries, along with location name and
-        proper credits'''
-        print(i)
+            failure = ['FAILED', f'{err.code} {target_nominatim}', 'NOT 200']
+    return [(result_sinks.FAILURE, line) for line in failure] + head + location + results + credits
 
 def get_lat(latitude: float) -> str:
     'Returns a string with the latitude in the desired format listed in specifications.'
@@ -0,0 +1,269 @@
+'''
+Lightweight instrumentation of where the time of a run goes: timed spans
+around each stage of a job and each API request, and counters such as cache
+hits, bytes downloaded and periods loaded. Disabled by default, in which case
+span returns one shared context that does nothing and count returns at once,
+so the instrumented code pays for little more than a function call.
+
+Enabled with exporters through enable, or by setting WEATHERAPI_METRICS to a
+comma separated list of them:
+
+    stderr                    a summary table on stderr at exit
+    jsonl:PATH                every span as a json line, and the totals at exit
+    prometheus:PATH           the totals in the Prometheus text format at exit
+'''
+import atexit
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+ENVIRONMENT_VARIABLE = 'WEATHERAPI_METRICS'
+PROMETHEUS_PREFIX = 'weatherapi'
+
+_enabled = False
+_exporters = ()
+_spans = {}
+_counters = {}
+_lock = threading.Lock()
+_registered = False
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    'Times the code inside a with block and records it under name.'
+    __slots__ = ('_name', '_start')
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        _record_span(self._name, time.perf_counter() - self._start)
+
+
+def span(name: str):
+    '''
+    Returns a context manager that times its with block as the span name,
+    such as 'job.weather' or 'nws.forecast'.
+    '''
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def count(name: str, amount: int = 1) -> None:
+    'Adds amount to the counter name, such as \'cache.misses\'.'
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def snapshot() -> dict:
+    '''
+    Returns a library of 'spans', name -> {'count', 'seconds', 'max_seconds'},
+    and 'counters', name -> total, of everything recorded so far.
+    '''
+    with _lock:
+        return {
+            'spans': {
+                name: {'count': n, 'seconds': round(total, 6), 'max_seconds': round(longest, 6)}
+                for name, (n, total, longest) in sorted(_spans.items())
+            },
+            'counters': dict(sorted(_counters.items()))
+        }
+
+
+def reset() -> None:
+    'Forgets every span and counter recorded so far.'
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def enable(*exporters) -> None:
+    '''
+    Starts recording, and exports the totals to every exporter when flush is
+    called or the program exits.
+    '''
+    global _enabled, _exporters, _registered
+    with _lock:
+        _exporters = _exporters + exporters
+        _enabled = True
+        if not _registered:
+            atexit.register(flush)
+            _registered = True
+
+
+def disable() -> None:
+    'Stops recording and forgets the exporters, without exporting.'
+    global _enabled, _exporters
+    with _lock:
+        _enabled = False
+        _exporters = ()
+
+
+def flush() -> None:
+    'Exports the totals recorded so far to every exporter.'
+    if not _exporters:
+        return
+    totals = snapshot()
+    for exporter in _exporters:
+        exporter.export(totals)
+
+
+class Exporter:
+    '''
+    Base of every exporter. record_span is called as each span finishes and
+    export with the totals of snapshot when flushing.
+    '''
+    def record_span(self, name: str, seconds: float) -> None:
+        pass
+
+    def export(self, totals: dict) -> None:
+        pass
+
+
+class StderrExporter(Exporter):
+    'Prints a table of the spans, slowest first, and the counters to stderr.'
+    def export(self, totals: dict) -> None:
+        lines = [f'{"span":<28} {"count":>8} {"seconds":>12} {"max":>12}']
+        spans = sorted(totals['spans'].items(), key = lambda item: -item[1]['seconds'])
+        for name, info in spans:
+            lines.append(f'{name:<28} {info["count"]:>8} {info["seconds"]:>12.6f} {info["max_seconds"]:>12.6f}')
+        for name, total in totals['counters'].items():
+            lines.append(f'{name:<28} {total:>8}')
+        print('\n'.join(lines), file = sys.stderr)
+
+
+class JSONLinesExporter(Exporter):
+    '''
+    Appends every span as a json line with its name, duration and end time
+    to the file at path, followed by the totals when flushing.
+    '''
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+        self._file_lock = threading.Lock()
+
+    def record_span(self, name: str, seconds: float) -> None:
+        self._write({'span': name, 'seconds': round(seconds, 6), 'time': time.time()})
+
+    def export(self, totals: dict) -> None:
+        self._write({'totals': totals, 'time': time.time()})
+        with self._file_lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def _write(self, info: dict) -> None:
+        line = json.dumps(info) + '\n'
+        with self._file_lock:
+            if self._file is None:
+                self._file = open(self._path, 'a')
+            self._file.write(line)
+
+
+class PrometheusExporter(Exporter):
+    '''
+    Writes the totals in the Prometheus text exposition format to the file
+    at path, replacing it, or to stdout if path is '-'.
+    '''
+    def __init__(self, path: str = '-'):
+        self._path = path
+
+    def export(self, totals: dict) -> None:
+        text = format_prometheus(totals)
+        if self._path == '-':
+            sys.stdout.write(text)
+            return
+        temporary = f'{self._path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(text)
+        os.replace(temporary, self._path)
+
+
+def format_prometheus(totals: dict) -> str:
+    'Returns the totals of snapshot in the Prometheus text exposition format.'
+    lines = []
+    for suffix, key, kind in (
+        ('span_count_total', 'count', 'counter'),
+        ('span_seconds_total', 'seconds', 'counter'),
+        ('span_max_seconds', 'max_seconds', 'gauge')
+    ):
+        metric = f'{PROMETHEUS_PREFIX}_{suffix}'
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, info in totals['spans'].items():
+            lines.append(f'{metric}{{span="{name}"}} {info[key]}')
+    for name, total in totals['counters'].items():
+        metric = f'{PROMETHEUS_PREFIX}_{_metric_name(name)}_total'
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {total}')
+    return '\n'.join(lines) + '\n'
+
+
+def exporter_from_spec(spec: str) -> Exporter:
+    '''
+    Returns the exporter described by spec, one of 'stderr', 'jsonl:PATH' or
+    'prometheus:PATH'. Raises ValueError for anything else.
+    '''
+    kind, _, path = spec.strip().partition(':')
+    if kind == 'stderr':
+        return StderrExporter()
+    elif kind == 'jsonl' and path:
+        return JSONLinesExporter(path)
+    elif kind == 'prometheus':
+        return PrometheusExporter(path or '-')
+    raise ValueError(f'unknown metrics exporter: {spec}')
+
+
+def enable_from_environment() -> None:
+    '''
+    Enables the exporters listed in WEATHERAPI_METRICS, if it is set. Specs
+    that aren't understood are reported on stderr and left out, since this
+    runs at import and a typo shouldn't stop the program.
+    '''
+    specs = os.environ.get(ENVIRONMENT_VARIABLE, '')
+    exporters = []
+    for spec in specs.split(','):
+        if not spec.strip():
+            continue
+        try:
+            exporters.append(exporter_from_spec(spec))
+        except ValueError as err:
+            print(f'{ENVIRONMENT_VARIABLE}: {err}, ignored', file = sys.stderr)
+    if exporters:
+        enable(*exporters)
+
+
+def _record_span(name: str, seconds: float) -> None:
+    with _lock:
+        entry = _spans.get(name)
+        if entry is None:
+            _spans[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+    for exporter in _exporters:
+        exporter.record_span(name, seconds)
+
+
+def _metric_name(name: str) -> str:
+    'Returns name with every character Prometheus doesn\'t allow replaced by _.'
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+enable_from_environment()
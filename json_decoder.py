@@ -0,0 +1,91 @@
+'''
+Decodes json from the bytes of a response or file. Uses orjson when it is
+installed, which parses the bytes without a str copy of the payload, and the
+standard library otherwise, given the payload decoded with the utf-8 codec,
+which skips its encoding detection. Either can be chosen with set_decoder or by
+setting WEATHERAPI_JSON to 'orjson' or 'json'. Errors are raised as
+json.JSONDecodeError by both.
+
+Forecasts up to STREAM_BYTES are decoded whole, which is faster than
+skipping parts of them in python. Larger forecasts go through the streaming
+forecast loader, which skips every subtree but the polygon and the periods,
+so memory stays bounded.
+'''
+import codecs
+import json
+import os
+import forecast_columns
+import forecast_loader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENVIRONMENT_VARIABLE = 'WEATHERAPI_JSON'
+DECODERS = ('orjson', 'json')
+STREAM_BYTES = 8 * 1024 * 1024
+
+_decoder = None
+
+
+def get_decoder() -> str:
+    'Returns the name of the decoder in use, \'orjson\' or \'json\'.'
+    return _decoder
+
+
+def set_decoder(name: str | None = None) -> None:
+    '''
+    Uses the decoder name, or the fastest one installed with None. Raises
+    ValueError if it is unknown or not installed.
+    '''
+    global _decoder
+    if name is None:
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in DECODERS:
+        raise ValueError(f'unknown json decoder: {name}')
+    if name == 'orjson' and orjson is None:
+        raise ValueError('orjson is not installed')
+    _decoder = name
+
+
+def loads(data: bytes):
+    'Returns the decoded json of data, utf-8 bytes with or without a BOM.'
+    if data[:3] == codecs.BOM_UTF8:
+        data = data[3:]
+    if _decoder == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data.decode(encoding = 'utf-8'))
+
+
+def load_file(file: str):
+    'Returns the decoded json of the file.'
+    with open(file, 'rb') as f:
+        return loads(f.read())
+
+
+def read_forecast(data: bytes) -> tuple:
+    '''
+    Returns (polygon, periods) from an hourly forecast payload, where
+    polygon is the first ring of 'geometry' -> 'coordinates' and periods is
+    the list of 'properties' -> 'periods'.
+    '''
+    if len(data) <= STREAM_BYTES:
+        info = loads(data)
+        return (info['geometry']['coordinates'][0], info['properties']['periods'])
+    return forecast_loader.read_forecast(data)
+
+
+def load_forecast(file: str, use_mmap: bool = False) -> tuple:
+    '''
+    Returns (polygon, columns) from the forecast file, like
+    forecast_loader.load_forecast. Files over STREAM_BYTES are always
+    streamed, through mmap if use_mmap.
+    '''
+    if os.path.getsize(file) <= STREAM_BYTES:
+        info = load_file(file)
+        return (info['geometry']['coordinates'][0], forecast_columns.ForecastColumns(info['properties']['periods']))
+    return forecast_loader.load_forecast(file, use_mmap)
+
+
+set_decoder(os.environ.get(ENVIRONMENT_VARIABLE) or None)
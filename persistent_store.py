@@ -0,0 +1,220 @@
+'''
+Persistence shared by the local stores kept between runs, the geocode store
+and the gridpoint index, along with the atomic writes every file kept on disk
+goes through. A store is a json file under STORE_DIRECTORY, apart from the
+response cache so clearing the cache leaves it. It is read once, and only
+written back after it changed, at most every SAVE_INTERVAL seconds and once
+more at exit, so a run of lookups costs a few writes instead of one each.
+
+Directories of cached files, the response cache and the forecast snapshots,
+are kept under a size limit by SizeLimit, which only scans the directory
+once the bytes written to it add up to more than the limit.
+'''
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+
+STORE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'weatherapi', 'stores')
+SAVE_INTERVAL = 5.0
+
+'Fraction of its limit a directory is brought down to, so the scan is not repeated on the next write'
+EVICT_TO = 0.9
+
+'Every store with a path, flushed at exit'
+_stores = weakref.WeakSet()
+
+
+def write_atomic(path: str, data: bytes | list[bytes]) -> None:
+    '''
+    Writes data, bytes or a list of chunks of bytes, to path through a
+    temporary file that replaces it, so concurrent readers never see half of
+    it. Raises OSError like open.
+    '''
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temporary, 'wb') as f:
+            if isinstance(data, list):
+                f.writelines(data)
+            else:
+                f.write(data)
+        os.replace(temporary, path)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def file_size(path: str) -> int:
+    'Returns the size of the file at path, or 0 if there is none.'
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+class SizeLimit:
+    '''
+    Keeps the files in directory whose names end with suffix under max_bytes,
+    removing the least recently used first, as told by their modification
+    times, along with the files of the same name ending with each of
+    companions. The total is counted by a scan and then kept up to date as
+    files are added, and once it passes max_bytes the directory is scanned
+    again and brought down to EVICT_TO of it. Files written by other
+    processes are only counted at the next scan.
+    '''
+    def __init__(self, directory: str, suffix: str, max_bytes: int, companions: tuple = ()):
+        self._directory = directory
+        self._suffix = suffix
+        self._max_bytes = max_bytes
+        self._companions = companions
+        self._total = None
+        self._lock = threading.Lock()
+
+    def add(self, size: int, previous: int = 0) -> None:
+        '''
+        Counts a file of size bytes written to the directory, replacing one of
+        previous bytes, removing files once the total passes max_bytes.
+        '''
+        with self._lock:
+            if self._total is not None:
+                self._total += size - previous
+                if self._total <= self._max_bytes:
+                    return
+            self._total = self._evict()
+
+    def reset(self) -> None:
+        'Forgets the total, so it is counted again by the next add.'
+        with self._lock:
+            self._total = None
+
+    def _evict(self) -> int:
+        'Returns the total after removing the least recently used files, if it is past max_bytes.'
+        try:
+            names = os.listdir(self._directory)
+        except OSError:
+            return 0
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(self._suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self._directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:len(name) - len(self._suffix)]))
+            total += stat.st_size
+        if total <= self._max_bytes:
+            return total
+        entries.sort()
+        for used, size, stem in entries:
+            if total <= self._max_bytes * EVICT_TO:
+                break
+            for suffix in (self._suffix,) + self._companions:
+                try:
+                    os.remove(os.path.join(self._directory, stem + suffix))
+                except OSError:
+                    pass
+            total -= size
+        return total
+
+
+class PersistentStore:
+    '''
+    Base of the stores kept as the json file at path, or only in memory with
+    None. Subclasses guard their contents with _lock, set _dirty holding it
+    whenever they change, and call _save_if_due once they released it. They
+    implement _restore, which reads the contents back from the decoded json,
+    _clear, which forgets them when the file can't be read, and _dumps, which
+    returns their json and is called holding _lock.
+    '''
+    def __init__(self, path: str | None, save_interval: float = SAVE_INTERVAL):
+        self._path = path
+        self._save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saved = float('-inf')
+        if path is not None:
+            _stores.add(self)
+
+    def flush(self) -> None:
+        'Writes the store if it changed since it was last written.'
+        if self._path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = self._dumps()
+                self._dirty = False
+                self._saved = time.monotonic()
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok = True)
+                write_atomic(self._path, data.encode('utf-8'))
+            except OSError:
+                'Failing to write only means the store is not kept between runs'
+
+    def _save_if_due(self) -> None:
+        'Writes the store if it changed and the last write was at least save_interval ago.'
+        if self._dirty and time.monotonic() - self._saved >= self._save_interval:
+            self.flush()
+
+    def _load(self) -> None:
+        if self._path is None:
+            return
+        try:
+            with open(self._path, 'rb') as f:
+                info = json.load(f)
+            with self._lock:
+                self._restore(info)
+        except (OSError, ValueError, KeyError, TypeError):
+            with self._lock:
+                self._clear()
+
+    def _restore(self, info) -> None:
+        raise NotImplementedError
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+    def _dumps(self) -> str:
+        raise NotImplementedError
+
+
+class DefaultStore:
+    '''
+    Holds the store a module shares, made by calling factory the first time
+    it is needed. A store that is replaced is flushed first.
+    '''
+    def __init__(self, factory):
+        self._factory = factory
+        self._store = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._store is None:
+                self._store = self._factory()
+            return self._store
+
+    def set(self, store) -> None:
+        with self._lock:
+            previous = self._store
+            self._store = store
+        if previous is not None and previous is not store:
+            previous.flush()
+
+
+def flush_all() -> None:
+    'Writes every store that changed since it was last written.'
+    for store in list(_stores):
+        store.flush()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,187 @@
+'''
+Answers every query requested by the user without walking the forecast
+periods. Each query is parsed and its max/min is looked up in the forecast
+index of the weather object. The answers are returned in the
+same order the queries were given.
+
+Besides the first N periods, a query can cover the window of periods from A
+up to but not including B, written A-B, or every local day, written DAILY,
+which answers with one line per day. Besides MAX and MIN, the limit can be
+AVG, SUM or a percentile such as P50 or P90:
+
+    WIND 24 AVG
+    HUMIDITY 12-36 P90
+    PRECIPITATION 48 SUM
+    TEMPERATURE AIR F DAILY MAX
+
+Query strings are compiled once into QueryPlans, cached by string, and the
+answers of every plan are remembered per forecast, so a query repeated
+against the same forecast, as in server and batch mode, costs a couple of
+dictionary lookups.
+'''
+import collections
+import functools
+import threading
+import weakref
+import instrumentation
+
+TEMPERATURE_AIR = 'temperature'
+TEMPERATURE_FEELS = 'feels'
+HUMIDITY = 'humidity'
+WIND = 'wind'
+PRECIPITATION = 'precipitation'
+
+EXTREMES = ('MAX', 'MIN')
+AGGREGATES = ('AVG', 'SUM')
+DAILY = 'DAILY'
+
+'How many compiled query strings, and answers per forecast, are kept'
+MAX_PLANS = 1024
+MAX_ANSWERS = 1024
+
+_answers = weakref.WeakKeyDictionary()
+_answers_lock = threading.Lock()
+
+
+def parse_query(query: str) -> tuple | None:
+    '''
+    Splits a query into (metric, scale, start, end, limit), where the periods
+    from start up to but not including end are covered, or start and end are
+    both None for a DAILY query. Returns None if the query isn't one of the
+    supported kinds, or covers no periods, so it can be skipped.
+    '''
+    x = query.split(' ')
+    if query.startswith('TEMPERATURE AIR '):
+        metric, scale, length, limit = (TEMPERATURE_AIR, x[2], x[3], x[4])
+    elif query.startswith('TEMPERATURE FEELS '):
+        metric, scale, length, limit = (TEMPERATURE_FEELS, x[2], x[3], x[4])
+    elif query.startswith('HUMIDITY '):
+        metric, scale, length, limit = (HUMIDITY, None, x[1], x[2])
+    elif query.startswith('WIND '):
+        metric, scale, length, limit = (WIND, None, x[1], x[2])
+    elif query.startswith('PRECIPITATION'):
+        metric, scale, length, limit = (PRECIPITATION, None, x[1], x[2])
+    else:
+        return None
+    if not _is_limit(limit) or (limit == 'SUM' and metric in (TEMPERATURE_AIR, TEMPERATURE_FEELS)):
+        return None
+    if length == DAILY:
+        return (metric, scale, None, None, limit)
+    start, dash, end = length.partition('-')
+    start, end = (int(start), int(end)) if dash else (0, int(length))
+    if end <= start:
+        return None
+    return (metric, scale, start, end, limit)
+
+
+def _is_limit(limit: str) -> bool:
+    'Returns whether limit is MAX, MIN, AVG, SUM or a percentile from P0 to P100.'
+    if limit in EXTREMES or limit in AGGREGATES:
+        return True
+    return limit[:1] == 'P' and limit[1:].isdigit() and int(limit[1:]) <= 100
+
+
+class QueryPlan:
+    '''
+    A compiled query: the metric, scale, periods and limit parsed from the
+    query string. Calling it with a weather object returns its result lines,
+    one for most queries and one per local day for DAILY queries.
+    '''
+    __slots__ = ('metric', 'scale', 'start', 'end', 'limit')
+
+    def __init__(self, metric: str, scale: str | None, start: int | None, end: int | None, limit: str):
+        self.metric = metric
+        self.scale = scale
+        self.start = start
+        self.end = end
+        self.limit = limit
+
+    def __call__(self, weather) -> tuple[str, ...]:
+        if self.start is None:
+            return tuple(
+                f'{date} ' + _format(self.metric, self.scale, self.limit, weather.get_time(index), value)
+                for date, index, value in weather.get_daily(self.metric, self.limit)
+            )
+        instrumentation.count('periods_queried', self.end - self.start)
+        if self.start == 0 and self.limit in EXTREMES:
+            index, value = weather.get_extreme(self.metric, self.end, self.limit)
+        elif self.limit in EXTREMES:
+            index, value = weather.get_window_extreme(self.metric, self.start, self.end, self.limit)
+        else:
+            index, value = weather.get_aggregate(self.metric, self.start, self.end, self.limit)
+        return (_format(self.metric, self.scale, self.limit, weather.get_time(index), value),)
+
+
+@functools.lru_cache(maxsize = MAX_PLANS)
+def compile_query(query: str) -> QueryPlan | None:
+    'Returns the plan of a query, or None if it isn\'t one of the supported kinds.'
+    parsed = parse_query(query)
+    if parsed is None:
+        return None
+    return QueryPlan(*parsed)
+
+
+def answer_queries(weather, list_of_queries: list[str]) -> list[str]:
+    '''
+    Returns the result string of every supported query in list_of_queries,
+    in the order they were requested. weather can be any object that has
+    get_extreme and get_time methods, like WeatherFile or WeatherNominatim,
+    and get_window_extreme, get_aggregate and get_daily for windowed,
+    aggregate and DAILY queries.
+    Answers are remembered for weather objects that have get_columns, under
+    the columns they share with every other object of the same forecast.
+    '''
+    answers = _answers_of(weather)
+    results = []
+    for query in list_of_queries:
+        plan = compile_query(query)
+        if plan is None:
+            continue
+        instrumentation.count('queries')
+        if answers is None:
+            results.extend(plan(weather))
+            continue
+        with _answers_lock:
+            answer = answers.get(plan)
+            if answer is not None:
+                answers.move_to_end(plan)
+        if answer is None:
+            answer = plan(weather)
+            with _answers_lock:
+                answers[plan] = answer
+                if len(answers) > MAX_ANSWERS:
+                    answers.popitem(last = False)
+        else:
+            instrumentation.count('queries_memoized')
+        results.extend(answer)
+    return results
+
+
+def _answers_of(weather) -> collections.OrderedDict | None:
+    '''
+    Returns the remembered plan -> answer of the forecast of weather, or None
+    if weather can't be identified. They are forgotten with the forecast.
+    '''
+    get_columns = getattr(weather, 'get_columns', None)
+    if get_columns is None:
+        return None
+    columns = get_columns()
+    with _answers_lock:
+        answers = _answers.get(columns)
+        if answers is None:
+            answers = _answers[columns] = collections.OrderedDict()
+        return answers
+
+
+def _format(metric: str, scale: str | None, limit: str, time: str, value: float) -> str:
+    '''
+    Returns the result string for one query, matching the weather classes.
+    A sum of percentages isn't a percentage, so it is written without a %.
+    '''
+    if metric in (TEMPERATURE_AIR, TEMPERATURE_FEELS):
+        if scale == 'C':
+            value = (value - 32) * (5 / 9)
+        return time + ' ' + f'{value:.4f}'
+    elif metric in (HUMIDITY, PRECIPITATION) and limit != 'SUM':
+        return f'{time} {value:.4f}%'
+    return f'{time} {value:.4f}'
@@ -0,0 +1,125 @@
+'''
+Token bucket rate limits for every upstream host, replacing the blanket
+time.sleep(1) that was used to respect the Nominatim usage policy. Every
+request takes a token, and only waits as long as needed for the bucket to
+refill, so requests go out at the allowed rate and no faster. A bucket can be
+shared by threads and asyncio tasks, and optionally by separate processes
+through a locked state file.
+'''
+import asyncio
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+'Requests per second allowed for each host, Nominatim allows 1 per second'
+RATE_LIMITS = {
+    'nominatim.openstreetmap.org': 1.0,
+    'api.weather.gov': 5.0
+}
+
+_STATE = struct.Struct('<dd')
+
+
+class TokenBucket:
+    '''
+    Holds up to capacity tokens, refilled at rate tokens per second. Taking a
+    token from an empty bucket reserves the next one, so waiting callers are
+    served in the order they arrived. With state_file, the tokens are stored
+    in that file under an exclusive lock so every process sharing the file
+    shares the bucket (only where fcntl is available).
+    '''
+    def __init__(self, rate: float, capacity: float = 1, state_file: str | None = None):
+        self._rate = rate
+        self._capacity = capacity
+        self._state_file = state_file if fcntl is not None else None
+        self._tokens = capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        'Takes a token and returns how many seconds to wait before using it.'
+        with self._lock:
+            if self._state_file is None:
+                self._tokens, self._updated, wait = self._take(self._tokens, self._updated)
+                return wait
+            return self._reserve_shared()
+
+    def acquire(self) -> None:
+        'Blocks the calling thread until a token is available.'
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        'Waits without blocking the event loop until a token is available.'
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _take(self, tokens: float, updated: float) -> tuple:
+        'Returns (tokens, updated, wait) after refilling the bucket and taking a token.'
+        now = time.time()
+        tokens = min(self._capacity, tokens + max(0.0, now - updated) * self._rate) - 1
+        wait = 0.0 if tokens >= 0 else -tokens / self._rate
+        return (tokens, now, wait)
+
+    def _reserve_shared(self) -> float:
+        fd = os.open(self._state_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = os.pread(fd, _STATE.size, 0)
+            if len(data) == _STATE.size:
+                tokens, updated = _STATE.unpack(data)
+            else:
+                tokens, updated = self._capacity, time.time()
+            tokens, updated, wait = self._take(tokens, updated)
+            os.pwrite(fd, _STATE.pack(tokens, updated), 0)
+            return wait
+        finally:
+            os.close(fd)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def configure(host: str, rate: float | None, capacity: float = 1, state_file: str | None = None) -> None:
+    '''
+    Sets the rate limit of host in requests per second, or removes it with
+    None. state_file shares the limit with other processes.
+    '''
+    with _buckets_lock:
+        if rate is None:
+            RATE_LIMITS.pop(host, None)
+            _buckets.pop(host, None)
+        else:
+            RATE_LIMITS[host] = rate
+            _buckets[host] = TokenBucket(rate, capacity, state_file)
+
+
+def get_bucket(host: str) -> TokenBucket | None:
+    'Returns the bucket limiting requests to host, or None if host has no limit.'
+    with _buckets_lock:
+        if host not in _buckets and host in RATE_LIMITS:
+            _buckets[host] = TokenBucket(RATE_LIMITS[host])
+        return _buckets.get(host)
+
+
+def acquire(host: str) -> None:
+    'Blocks until a request to host is allowed.'
+    bucket = get_bucket(host)
+    if bucket is not None:
+        bucket.acquire()
+
+
+async def acquire_async(host: str) -> None:
+    'Waits without blocking the event loop until a request to host is allowed.'
+    bucket = get_bucket(host)
+    if bucket is not None:
+        await bucket.acquire_async()
@@ -0,0 +1,93 @@
+'''
+Sinks that write the output of jobs as soon as each one is finished, so a
+large batch is written with constant memory instead of being collected
+first. A job's output is a list of (kind, line) records, in order, where
+kind says what the line is:
+
+    failure     the FAILED line and the reason for it
+    target      the coordinates of the target
+    location    the display name of the reverse searched location
+    result      the answer to one query
+    credit      the credit of a data source
+
+TextSink writes the lines exactly as the interactive mode prints them, one
+write per job. JSONLinesSink and CSVSink write one row per line with the
+job's number, the line's index within the job, its kind and its text, for
+loading into other tools.
+'''
+import csv
+import json
+import sys
+
+FAILURE = 'failure'
+TARGET = 'target'
+LOCATION = 'location'
+RESULT = 'result'
+CREDIT = 'credit'
+
+CSV_HEADER = ('job', 'index', 'kind', 'text')
+
+
+class ResultSink:
+    '''
+    Base of every sink, writing to stream, stdout by default. Closing a sink
+    flushes the stream but doesn't close it. Sinks can be used in a with
+    statement to close them at the end.
+    '''
+    def __init__(self, stream = None):
+        self._stream = stream if stream is not None else sys.stdout
+
+    def write(self, number: int, records: list[tuple]) -> None:
+        'Writes the (kind, line) records of job number.'
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self._stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class TextSink(ResultSink):
+    'Writes every line as is, like the interactive mode prints them.'
+    def write(self, number: int, records: list[tuple]) -> None:
+        if records:
+            self._stream.write('\n'.join(line for kind, line in records) + '\n')
+
+
+class JSONLinesSink(ResultSink):
+    'Writes every line as a json object with its job, index, kind and text.'
+    def write(self, number: int, records: list[tuple]) -> None:
+        if records:
+            self._stream.write(''.join(
+                json.dumps({'job': number, 'index': index, 'kind': kind, 'text': line}) + '\n'
+                for index, (kind, line) in enumerate(records)
+            ))
+
+
+class CSVSink(ResultSink):
+    'Writes every line as a csv row of its job, index, kind and text, after a header row.'
+    def __init__(self, stream = None):
+        super().__init__(stream)
+        self._writer = csv.writer(self._stream, lineterminator = '\n')
+        self._writer.writerow(CSV_HEADER)
+
+    def write(self, number: int, records: list[tuple]) -> None:
+        self._writer.writerows((number, index, kind, line) for index, (kind, line) in enumerate(records))
+
+
+SINKS = {
+    'text': TextSink,
+    'jsonl': JSONLinesSink,
+    'csv': CSVSink
+}
+
+
+def make_sink(output_format: str, stream = None) -> ResultSink:
+    'Returns the sink for output_format, one of SINKS, writing to stream. Raises ValueError for anything else.'
+    if output_format not in SINKS:
+        raise ValueError(f'unknown output format: {output_format}')
+    return SINKS[output_format](stream)
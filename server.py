@@ -0,0 +1,266 @@
+'''
+Server mode: a long-running process that answers jobs over HTTP, on a TCP
+port or a Unix socket, instead of reading one job from the user input and
+exiting. Loaded forecasts, geocoding results and forecast indexes stay warm
+in memory between requests, and requests are handled by a pool of worker
+threads. A keep-alive connection only keeps its worker while it is busy:
+it is closed once it has been idle for IDLE_TIMEOUT, or idle for just
+POLL_INTERVAL while another connection is waiting for a worker.
+
+    POST /job    {"target": "TARGET FILE ...", "weather": "WEATHER NWS",
+                  "queries": ["WIND 24 MAX", ...], "reverse": "REVERSE ..."}
+              -> {"lines": [...], "latency_ms": 1.234}
+    GET /stats   -> request count and latency percentiles
+
+    python server.py [--host HOST] [--port N | --socket PATH] [--workers N]
+'''
+import argparse
+import concurrent.futures
+import http.server
+import json
+import os
+import selectors
+import socket
+import socketserver
+import sys
+import threading
+import time
+import input_processor
+
+HOST = '127.0.0.1'
+PORT = 8000
+WORKERS = 8
+
+'Seconds a keep-alive connection can wait for its next request, and how often it checks for other connections meanwhile'
+IDLE_TIMEOUT = 5.0
+POLL_INTERVAL = 0.05
+
+'How many recent latencies are kept for the percentiles in /stats'
+LATENCY_WINDOW = 10000
+
+
+class LatencyStats:
+    'Counts requests and keeps the latency of the most recent ones.'
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._window = window
+        self._latencies = []
+        self._count = 0
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, milliseconds: float, error: bool = False) -> None:
+        with self._lock:
+            self._count += 1
+            if error:
+                self._errors += 1
+            self._latencies.append(milliseconds)
+            if len(self._latencies) > self._window:
+                del self._latencies[:len(self._latencies) - self._window]
+
+    def summary(self) -> dict:
+        'Returns the request count, error count and latency percentiles in milliseconds.'
+        with self._lock:
+            latencies = sorted(self._latencies)
+            summary = {'requests': self._count, 'errors': self._errors}
+        if latencies:
+            for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+                summary[f'{name}_ms'] = round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))], 3)
+            summary['max_ms'] = round(latencies[-1], 3)
+        return summary
+
+
+def run_job(job: dict) -> list[str]:
+    '''
+    Returns the output lines of a job given as a library with 'target',
+    'weather', 'queries' and 'reverse', the same as the user input.
+    '''
+    queries = list(job.get('queries', []))
+    if not queries or queries[-1] != 'NO MORE QUERIES':
+        queries.append('NO MORE QUERIES')
+    return input_processor.evaluate_target(job['target'], job['weather'], queries, job['reverse'])
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    timeout = IDLE_TIMEOUT
+
+    def handle(self):
+        'Handles requests until the connection closes or _wait_for_request gives it up.'
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._wait_for_request():
+            self.handle_one_request()
+
+    def _wait_for_request(self) -> bool:
+        '''
+        Waits for the next request on a keep-alive connection, up to
+        IDLE_TIMEOUT, and returns whether one arrived. Returns False once the
+        connection has been idle for POLL_INTERVAL while another connection
+        is waiting for a worker, so an idle client never keeps one from the
+        others, while a busy client sending its next request keeps it.
+        '''
+        'A request may already be buffered, which the socket can\'t tell'
+        self.connection.setblocking(False)
+        try:
+            if self.rfile.peek(1):
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.connection, selectors.EVENT_READ)
+            while True:
+                now = time.monotonic()
+                if now >= deadline or (now - start >= POLL_INTERVAL and self.server.has_waiting()):
+                    return False
+                if selector.select(min(POLL_INTERVAL, deadline - now)):
+                    return True
+
+    def do_POST(self):
+        if self.path != '/job':
+            self._send(404, {'error': 'not found'})
+            return
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = json.loads(self.rfile.read(length))
+        except ValueError as err:
+            self._finish(start, 400, {'error': f'invalid json: {err}'})
+            return
+        try:
+            lines = run_job(job)
+        except Exception as err:
+            'Malformed jobs and queries fail that request only'
+            self._finish(start, 500, {'error': f'{type(err).__name__}: {err}'})
+            return
+        self._finish(start, 200, {'lines': lines})
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(200, self.server.stats.summary())
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def _finish(self, start: float, status: int, info: dict) -> None:
+        'Records the latency of the request since start and sends info with it.'
+        elapsed = (time.perf_counter() - start) * 1000
+        self.server.stats.record(elapsed, error = status != 200)
+        info['latency_ms'] = round(elapsed, 3)
+        self._send(status, info)
+
+    def _send(self, status: int, info: dict) -> None:
+        body = json.dumps(info).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        'Unix socket clients have no address.'
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, *args):
+        pass
+
+
+class _UnixHandler(_Handler):
+    'Unix sockets have no Nagle algorithm to disable.'
+    disable_nagle_algorithm = False
+
+
+class _PoolMixIn:
+    '''
+    Handles every connection on a fixed pool of worker threads, instead of a
+    new thread per connection like ThreadingMixIn. Keeps track of the open
+    connections, and of how many are waiting for a worker.
+    '''
+    def start_pool(self, workers: int) -> None:
+        self.stats = LatencyStats()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers = workers)
+        self._connections = set()
+        self._waiting = 0
+        self._connections_lock = threading.Lock()
+
+    def has_waiting(self) -> bool:
+        'Returns whether a connection is waiting for a worker.'
+        return self._waiting > 0
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+            self._waiting += 1
+        self._pool.submit(self._process_in_worker, request, client_address)
+
+    def _process_in_worker(self, request, client_address):
+        with self._connections_lock:
+            self._waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._connections_lock:
+                self._connections.discard(request)
+            self.shutdown_request(request)
+
+    def server_close(self):
+        '''
+        Stops listening and shuts every open connection down, so workers
+        waiting on idle connections return at once instead of holding up the
+        exit of the process.
+        '''
+        super().server_close()
+        self._pool.shutdown(wait = False, cancel_futures = True)
+        with self._connections_lock:
+            connections = list(self._connections)
+        for request in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class JobServer(_PoolMixIn, http.server.HTTPServer):
+    'Answers jobs on a TCP address with a pool of workers.'
+    def __init__(self, host: str = HOST, port: int = PORT, workers: int = WORKERS):
+        self.start_pool(workers)
+        super().__init__((host, port), _Handler)
+
+
+class UnixJobServer(_PoolMixIn, socketserver.UnixStreamServer):
+    'Answers jobs on a Unix socket at path with a pool of workers.'
+    def __init__(self, path: str, workers: int = WORKERS):
+        self.start_pool(workers)
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, _UnixHandler)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description = 'Answer jobs over HTTP, keeping caches warm.')
+    parser.add_argument('--host', default = HOST)
+    parser.add_argument('--port', type = int, default = PORT)
+    parser.add_argument('--socket', help = 'listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--workers', type = int, default = WORKERS)
+    args = parser.parse_args(argv)
+    if args.socket and hasattr(socket, 'AF_UNIX'):
+        server = UnixJobServer(args.socket, args.workers)
+        print(f'Serving on {args.socket}', file = sys.stderr)
+    else:
+        server = JobServer(args.host, args.port, args.workers)
+        print(f'Serving on http://{args.host}:{server.server_port}', file = sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,82 @@
+'''
+Coalesces concurrent identical work: while a call for a key is in flight,
+every other caller asking for the same key waits for it and shares its
+result, or its exception, instead of doing the work again. Callers can be
+threads, through do, or asyncio coroutines, through do_async, and both
+kinds share the same calls in flight. Once a call finishes its key is
+forgotten, so the next caller starts a new one.
+
+Every coalesced caller is counted, both in the flight itself and as the
+counter '<name>.coalesced' when instrumentation is enabled.
+'''
+import asyncio
+import concurrent.futures
+import threading
+import instrumentation
+
+
+class SingleFlight:
+    '''
+    Tracks the calls in flight as the library of key -> future of the
+    result. name labels the counters of this flight, such as 'nws.points'.
+    '''
+    def __init__(self, name: str):
+        self._name = name
+        self._calls = {}
+        self._started = 0
+        self._coalesced = 0
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args):
+        '''
+        Returns function(*args), or the result of the call for key already
+        in flight, waiting for it on this thread.
+        '''
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        return self._run(key, future, function, args)
+
+    async def do_async(self, key, function, *args):
+        '''
+        Returns function(*args), run on a worker thread since it blocks, or
+        the result of the call for key already in flight, without blocking
+        the event loop while waiting.
+        '''
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        return await asyncio.to_thread(self._run, key, future, function, args)
+
+    def counts(self) -> dict:
+        'Returns a library of how many calls were \'started\' and how many callers were \'coalesced\' into them.'
+        with self._lock:
+            return {'started': self._started, 'coalesced': self._coalesced}
+
+    def _join(self, key) -> tuple:
+        '''
+        Returns (future, whether the caller is the leader that has to make
+        the call) for key.
+        '''
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = concurrent.futures.Future()
+                self._started += 1
+                return (future, True)
+            self._coalesced += 1
+        instrumentation.count(f'{self._name}.coalesced')
+        return (future, False)
+
+    def _run(self, key, future: concurrent.futures.Future, function, args: tuple):
+        try:
+            result = function(*args)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,43 @@
+'''
+Registry of the sources that targets, forecasts and reverse geocoding can
+come from, as named in the user input, such as 'FILE' or 'NWS'. Each source
+is recorded as the module and class that provide it, and the module is only
+imported the first time the source is used, so a run that only reads files
+never imports the HTTP client, its TLS support or the response cache. New
+sources, such as another forecast provider, are added with register.
+'''
+import importlib
+
+TARGET = 'TARGET'
+WEATHER = 'WEATHER'
+REVERSE = 'REVERSE'
+
+'kind -> source -> (module, class)'
+SOURCES = {
+    TARGET: {
+        'FILE': ('test_from_path', 'TargetFile'),
+        'NOMINATIM': ('api_nominatim', 'TargetNominatim')
+    },
+    WEATHER: {
+        'FILE': ('test_from_path', 'WeatherFile'),
+        'NWS': ('api_nominatim', 'WeatherNominatim')
+    },
+    REVERSE: {
+        'FILE': ('test_from_path', 'ReverseFile'),
+        'NOMINATIM': ('api_nominatim', 'ReverseNominatim')
+    }
+}
+
+
+def register(kind: str, source: str, module: str, name: str) -> None:
+    '''
+    Adds or replaces the source of the given kind, provided by the class name
+    in module, which isn't imported until the source is used.
+    '''
+    SOURCES.setdefault(kind, {})[source] = (module, name)
+
+
+def get_class(kind: str, source: str):
+    'Returns the class providing the source of the given kind, importing its module if needed.'
+    module, name = SOURCES[kind][source]
+    return getattr(importlib.import_module(module), name)
@@ -0,0 +1,102 @@
+'''
+Checks that updating ForecastColumns and their index from a newer version of
+the same forecast gives the same columns and answers as building them afresh,
+with the pure python columns and with NumPy when it is installed.
+'''
+import copy
+import pytest
+import feels_like
+import forecast
+import forecast_columns
+import forecast_index
+from benchmarks import synthetic
+
+
+def same(a: float, b: float) -> bool:
+    return a == b or (a != a and b != b)
+
+
+@pytest.fixture(autouse = True, params = ['python', 'numpy'])
+def backend(request, monkeypatch):
+    'Runs every test with each backend of the columns, the feels like temperature and the index.'
+    numpy = pytest.importorskip('numpy') if request.param == 'numpy' else None
+    for module in (forecast_columns, feels_like, forecast_index):
+        monkeypatch.setattr(module, 'numpy', numpy)
+    return request.param
+
+
+def shifted(periods: list, hours: int) -> list:
+    'Returns the next download of periods, hours later, with as many new periods at the end.'
+    return periods[hours:] + synthetic.make_periods(len(periods) + hours, seed = 1)[len(periods):]
+
+
+def edited(periods: list, row: int) -> list:
+    'Returns periods with the humidity of one row changed.'
+    periods = copy.deepcopy(periods)
+    periods[row]['relativeHumidity']['value'] = (periods[row]['relativeHumidity']['value'] + 7) % 100
+    return periods
+
+
+def with_missing(periods: list, row: int) -> list:
+    'Returns periods with the chance of precipitation of one row missing.'
+    periods = copy.deepcopy(periods)
+    periods[row]['probabilityOfPrecipitation']['value'] = None
+    return periods
+
+
+def assert_same_columns(updated, fresh):
+    assert len(updated) == len(fresh)
+    for metric in forecast_columns.METRICS:
+        assert all(same(a, b) for a, b in zip(updated.column(metric), fresh.column(metric))), metric
+    assert list(updated.get_start()) == list(fresh.get_start())
+    assert list(updated.get_offsets()) == list(fresh.get_offsets())
+    assert updated.get_days() == fresh.get_days()
+
+
+def assert_same_index(updated, fresh, n: int):
+    windows = [(0, n), (0, 1), (3, 17), (5, n - 2), (n // 2, n), (n - 40, n - 1)]
+    for metric in forecast_columns.METRICS:
+        for limit in ('MAX', 'MIN'):
+            assert list(updated.prefix_indexes(metric, limit)) == list(fresh.prefix_indexes(metric, limit))
+            for start, end in windows:
+                assert updated.window(metric, start, end, limit) == fresh.window(metric, start, end, limit)
+        for kind in ('SUM', 'AVG', 'P50', 'P90'):
+            for start, end in windows:
+                a = updated.aggregate(metric, start, end, kind)
+                b = fresh.aggregate(metric, start, end, kind)
+                assert a[0] == b[0] and same(a[1], b[1]), (metric, kind, start, end)
+
+
+@pytest.mark.parametrize('change, first', [
+    (lambda periods: periods, 200),
+    (lambda periods: shifted(periods, 1), 0),
+    (lambda periods: shifted(periods, 24), 0),
+    (lambda periods: edited(periods, 150), 150),
+    (lambda periods: with_missing(edited(periods, 120), 60), 60),
+    (lambda periods: periods[:170], 170),
+    (lambda periods: periods + synthetic.make_periods(230, seed = 1)[200:], 200)
+])
+def test_update_matches_a_fresh_build(change, first):
+    periods = synthetic.make_periods(200)
+    columns = forecast_columns.ForecastColumns(periods)
+    index = forecast.build_index(columns)
+    newer = change(periods)
+    updated, changed = columns.update(newer)
+    assert changed == first
+    fresh = forecast_columns.ForecastColumns(newer)
+    assert_same_columns(updated, fresh)
+    assert_same_index(forecast.update_index(index, updated, changed), forecast.build_index(fresh), len(newer))
+
+
+def test_update_only_computes_changed_feels_like(monkeypatch):
+    periods = synthetic.make_periods(100)
+    columns = forecast_columns.ForecastColumns(periods)
+    computed = []
+    feels_like_column = feels_like.feels_like_column
+
+    def counting(temperature, humidity, wind):
+        computed.append(len(temperature))
+        return feels_like_column(temperature, humidity, wind)
+    monkeypatch.setattr(feels_like, 'feels_like_column', counting)
+    columns.update(edited(shifted(periods, 2), 40))
+    assert computed == [3]
@@ -0,0 +1,148 @@
+'''
+Checks the answers of ForecastIndex against a brute-force scan of the
+periods, on random columns with missing values, with the pure python index
+and with NumPy when it is installed.
+'''
+import array
+import math
+import random
+import pytest
+import forecast_index
+
+NAN = float('nan')
+
+
+def make_values(n: int, seed: int) -> array.array:
+    'Returns n random whole values, about one in eight of them missing.'
+    rng = random.Random(seed)
+    return array.array('d', [NAN if rng.random() < 0.125 else float(rng.randint(0, 20)) for _ in range(n)])
+
+
+def scan_extreme(values, start: int, end: int, limit: str) -> tuple:
+    'Returns (index, value) of the earliest max/min of the present values, or of start if there are none.'
+    best = None
+    for i in range(start, end):
+        if values[i] != values[i]:
+            continue
+        if best is None or (values[i] > values[best] if limit == 'MAX' else values[i] < values[best]):
+            best = i
+    if best is None:
+        return (start, NAN)
+    return (best, values[best])
+
+
+def same(a: float, b: float) -> bool:
+    return a == b or (a != a and b != b)
+
+
+@pytest.fixture(autouse = True, params = ['python', 'numpy'])
+def backend(request, monkeypatch):
+    'Runs every test with each backend of forecast_index.'
+    if request.param == 'numpy':
+        monkeypatch.setattr(forecast_index, 'numpy', pytest.importorskip('numpy'))
+    else:
+        monkeypatch.setattr(forecast_index, 'numpy', None)
+    return request.param
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_prefix_skips_missing_values(seed):
+    values = make_values(97, seed)
+    values[0] = NAN
+    values[1] = NAN
+    index = forecast_index.ForecastIndex({'m': values})
+    for length in range(1, len(values) + 1):
+        for limit in ('MAX', 'MIN'):
+            expected = scan_extreme(values, 0, length, limit)
+            i, value = index.prefix('m', length, limit)
+            assert same(value, expected[1]), (length, limit)
+            if value == value:
+                assert i == expected[0]
+
+
+def test_backends_agree():
+    'Both backends give the same indexes for the same column.'
+    numpy = pytest.importorskip('numpy')
+    values = make_values(500, 1)
+    values[0] = NAN
+    for limit in ('MAX', 'MIN'):
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(forecast_index, 'numpy', None)
+            expected = list(forecast_index._running_extreme(values, limit))
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(forecast_index, 'numpy', numpy)
+            assert [int(i) for i in forecast_index._running_extreme(values, limit)] == expected
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_window_matches_scan(seed):
+    values = make_values(97, seed)
+    index = forecast_index.ForecastIndex({'m': values})
+    for start in range(len(values)):
+        for end in range(start + 1, len(values) + 1):
+            for limit in ('MAX', 'MIN'):
+                expected = scan_extreme(values, start, end, limit)
+                i, value = index.window('m', start, end, limit)
+                assert same(value, expected[1]), (start, end, limit)
+                if value == value:
+                    assert i == expected[0]
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_short_windows_are_scanned(seed):
+    'Windows like the days of DAILY queries are answered without building a sparse table.'
+    values = make_values(200, seed)
+    index = forecast_index.ForecastIndex({'m': values})
+    for start in range(1, len(values)):
+        for end in range(start + 1, min(start + forecast_index.SCAN_PERIODS, len(values)) + 1):
+            for limit in ('MAX', 'MIN'):
+                expected = scan_extreme(values, start, end, limit)
+                i, value = index.window('m', start, end, limit)
+                assert same(value, expected[1]), (start, end, limit)
+                if value == value:
+                    assert i == expected[0]
+    assert not index._sparse
+
+
+def test_sparse_tables_agree():
+    'Both backends build the same sparse table for the same column.'
+    numpy = pytest.importorskip('numpy')
+    values = make_values(300, 2)
+    for limit in ('MAX', 'MIN'):
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(forecast_index, 'numpy', None)
+            expected = [list(level) for level in forecast_index._sparse_table(values, limit)]
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(forecast_index, 'numpy', numpy)
+            assert [[int(i) for i in level] for level in forecast_index._sparse_table(values, limit)] == expected
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_aggregate_matches_scan(seed):
+    values = make_values(64, seed)
+    index = forecast_index.ForecastIndex({'m': values})
+    rng = random.Random(seed)
+    for _ in range(500):
+        start = rng.randrange(len(values))
+        end = rng.randint(start + 1, len(values))
+        present = [v for v in values[start:end] if v == v]
+        assert index.aggregate('m', start, end, 'SUM') == (start, float(sum(present)))
+        average = index.aggregate('m', start, end, 'AVG')[1]
+        assert same(average, sum(present) / len(present) if present else NAN)
+        for percentile in (0, 1, 50, 90, 100):
+            i, value = index.aggregate('m', start, end, f'P{percentile}')
+            if not present:
+                assert value != value
+                continue
+            k = max(0, math.ceil(percentile / 100 * len(present)) - 1)
+            assert value == sorted(present)[k]
+            assert start <= i < end and values[i] == value
+
+
+def test_out_of_range_windows_raise():
+    index = forecast_index.ForecastIndex({'m': make_values(10, 0)})
+    for start, end in ((0, 11), (-1, 3), (4, 4)):
+        with pytest.raises(IndexError):
+            index.window('m', start, end, 'MAX')
+        with pytest.raises(IndexError):
+            index.aggregate('m', start, end, 'AVG')
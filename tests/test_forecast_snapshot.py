@@ -0,0 +1,96 @@
+'''
+Checks that snapshots give back the forecast they were written from, through
+mmap with NumPy and with memoryviews, and that they are only used while the
+json file they were made from hasn't changed.
+'''
+import os
+import pytest
+import feels_like
+import forecast
+import forecast_columns
+import forecast_index
+import forecast_snapshot
+from benchmarks import synthetic
+
+POLYGON = synthetic.make_polygon(33.6, -117.8)
+
+
+def same(a: float, b: float) -> bool:
+    return a == b or (a != a and b != b)
+
+
+@pytest.fixture(autouse = True, params = ['python', 'numpy'])
+def backend(request, monkeypatch):
+    'Runs every test with each backend of the snapshots, the columns and the index.'
+    numpy = pytest.importorskip('numpy') if request.param == 'numpy' else None
+    for module in (forecast_snapshot, forecast_columns, feels_like, forecast_index):
+        monkeypatch.setattr(module, 'numpy', numpy)
+    return request.param
+
+
+@pytest.fixture
+def source(tmp_path):
+    'A stand-in for the json file a snapshot is made from.'
+    path = tmp_path / 'forecast.json'
+    path.write_bytes(b'{}' * 64)
+    return path
+
+
+def write(tmp_path, source, periods: int = 100, name: str = 'forecast.snap', max_bytes: int = forecast_snapshot.MAX_BYTES):
+    'Returns (snapshot path, columns, index) of a snapshot of periods random periods.'
+    columns = forecast_columns.ForecastColumns(synthetic.make_periods(periods))
+    index = forecast.build_index(columns)
+    path = str(tmp_path / 'snapshots' / name)
+    forecast_snapshot.write_snapshot(path, POLYGON, columns, index, os.stat(source), max_bytes)
+    return (path, columns, index)
+
+
+def test_round_trip(tmp_path, source):
+    path, columns, index = write(tmp_path, source)
+    polygon, read_columns, read_index = forecast_snapshot.read_snapshot(path, os.stat(source))
+    assert polygon == [coordinate[:2] for coordinate in POLYGON]
+    assert len(read_columns) == len(columns)
+    for metric in forecast_columns.METRICS:
+        assert all(same(a, b) for a, b in zip(read_columns.column(metric), columns.column(metric))), metric
+        for limit in ('MAX', 'MIN'):
+            assert list(read_index.prefix_indexes(metric, limit)) == list(index.prefix_indexes(metric, limit))
+            assert read_index.window(metric, 10, 90, limit) == index.window(metric, 10, 90, limit)
+    assert list(read_columns.get_start()) == list(columns.get_start())
+    assert list(read_columns.get_offsets()) == list(columns.get_offsets())
+    assert read_columns.get_days() == columns.get_days()
+
+
+def test_changed_source_is_stale(tmp_path, source):
+    path, _, _ = write(tmp_path, source)
+    stat = os.stat(source)
+    assert forecast_snapshot.read_snapshot(path, stat) is not None
+    os.utime(source, ns = (stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert forecast_snapshot.read_snapshot(path, os.stat(source)) is None
+    source.write_bytes(b'{}' * 65)
+    os.utime(source, ns = (stat.st_atime_ns, stat.st_mtime_ns))
+    assert forecast_snapshot.read_snapshot(path, os.stat(source)) is None
+    'Without a stat the snapshot is used whatever its source'
+    assert forecast_snapshot.read_snapshot(path) is not None
+
+
+def test_missing_and_damaged_snapshots_are_ignored(tmp_path, source):
+    path, _, _ = write(tmp_path, source)
+    assert forecast_snapshot.read_snapshot(str(tmp_path / 'missing.snap')) is None
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-8])
+    assert forecast_snapshot.read_snapshot(path) is None
+    with open(path, 'wb') as f:
+        f.write(b'NOTSNAP!' + data[8:])
+    assert forecast_snapshot.read_snapshot(path) is None
+
+
+def test_least_recently_used_snapshots_are_removed_past_max_bytes(tmp_path, source):
+    path, _, _ = write(tmp_path, source, name = 'probe.snap')
+    size = os.path.getsize(path)
+    os.remove(path)
+    for i in range(6):
+        path, _, _ = write(tmp_path, source, name = f'{i}.snap', max_bytes = 3 * size + size // 2)
+        os.utime(path, ns = (i * 1_000_000_000, i * 1_000_000_000))
+    assert sorted(os.listdir(tmp_path / 'snapshots')) == ['3.snap', '4.snap', '5.snap']
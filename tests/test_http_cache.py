@@ -0,0 +1,144 @@
+'''
+Checks HTTPCache against the local mock Nominatim/NWS server: fresh
+responses come from the cache, stale ones are revalidated with their ETag,
+each class of endpoint stays fresh for its own time, and the least recently
+used responses are removed past max_bytes.
+'''
+import os
+import time
+import pytest
+import http_cache
+import http_client
+from benchmarks import mock_server
+
+
+class Clock:
+    'Stands in for the time module in http_cache, so tests can move time forward.'
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self) -> float:
+        return self.now
+
+
+class RecordingClient(http_client.HTTPClient):
+    'Records the status of every response.'
+    def __init__(self):
+        super().__init__(retries = 0)
+        self.statuses = []
+
+    def request(self, url: str, headers: dict | None = None) -> http_client.Response:
+        response = super().request(url, headers)
+        self.statuses.append(response.status)
+        return response
+
+
+@pytest.fixture(scope = 'module')
+def running_server():
+    with mock_server.MockServer(latency = 0) as server:
+        yield server
+
+
+@pytest.fixture
+def server(running_server):
+    'The mock server, with its request counts and forecasts reset.'
+    running_server.requests.clear()
+    running_server.hour = 0
+    return running_server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_cache, 'time', clock)
+    return clock
+
+
+def make_cache(directory, max_bytes: int = http_cache.MAX_BYTES) -> tuple:
+    'Returns (cache without a memory layer, its client), so every hit is read from disk.'
+    client = RecordingClient()
+    return (http_cache.HTTPCache(str(directory), max_bytes, client, memory_bytes = 0), client)
+
+
+def test_fresh_response_is_served_from_the_cache(tmp_path, server, clock):
+    cache, client = make_cache(tmp_path)
+    url = f'{server.get_url()}/search?q=Irvine&format=geojson'
+    body = cache.get(url)
+    assert cache.get(url) == body
+    assert server.requests == {'search': 1}
+    assert client.statuses == [200]
+
+
+def test_equivalent_urls_share_an_entry(tmp_path, server, clock):
+    cache, client = make_cache(tmp_path)
+    cache.get(f'{server.get_url()}/search?q=Irvine&format=geojson')
+    cache.get(f'{server.get_url()}/search?format=geojson&q=Irvine'.replace('http://', 'HTTP://'))
+    assert server.requests == {'search': 1}
+
+
+def test_stale_response_is_revalidated_with_its_etag(tmp_path, server, clock):
+    cache, client = make_cache(tmp_path)
+    url = f'{server.get_url()}/points/33.6,-117.8'
+    body = cache.get(url)
+    clock.now += http_cache.POINTS_TTL + 1
+    assert cache.get(url) == body
+    assert client.statuses == [200, 304]
+    'Revalidated, so fresh again for another POINTS_TTL'
+    clock.now += http_cache.POINTS_TTL - 1
+    assert cache.get(url) == body
+    assert client.statuses == [200, 304]
+
+
+def test_changed_response_is_downloaded_again(tmp_path, server, clock):
+    cache, client = make_cache(tmp_path)
+    url = f'{server.get_url()}/gridpoints/MCK/1,2/forecast/hourly'
+    body = cache.get(url)
+    server.advance()
+    clock.now += http_cache.FORECAST_TTL + 1
+    assert cache.get(url) != body
+    assert client.statuses == [200, 200]
+
+
+def test_each_endpoint_stays_fresh_for_its_own_time(tmp_path, server, clock):
+    cache, client = make_cache(tmp_path)
+    base = server.get_url()
+    urls = [
+        f'{base}/search?q=Irvine',
+        f'{base}/points/33.6,-117.8',
+        f'{base}/gridpoints/MCK/1,2/forecast/hourly'
+    ]
+    for url in urls:
+        cache.get(url)
+    clock.now += http_cache.FORECAST_TTL + 1
+    for url in urls:
+        cache.get(url)
+    assert server.requests == {'search': 1, 'points': 1, 'gridpoints': 2}
+    clock.now += http_cache.POINTS_TTL
+    for url in urls:
+        cache.get(url)
+    assert server.requests == {'search': 1, 'points': 2, 'gridpoints': 3}
+
+
+def test_least_recently_used_responses_are_removed_past_max_bytes(tmp_path, server, clock):
+    base = server.get_url()
+    size = len(http_cache.HTTPCache(str(tmp_path / 'probe'), client = RecordingClient()).get(f'{base}/search?q=place0'))
+    cache, client = make_cache(tmp_path / 'cache', max_bytes = 4 * size + size // 2)
+    urls = [f'{base}/search?q=place{i}' for i in range(8)]
+    cache.get(urls[0])
+    for url in urls[1:]:
+        time.sleep(0.01)
+        'Reading the first response again keeps it the most recently used'
+        cache.get(urls[0])
+        cache.get(url)
+    bodies = [name for name in os.listdir(tmp_path / 'cache') if name.endswith('.body')]
+    assert sum(os.path.getsize(tmp_path / 'cache' / name) for name in bodies) <= 4 * size + size // 2
+    assert len(bodies) < len(urls)
+    assert sorted(os.listdir(tmp_path / 'cache')) == sorted(
+        name[:-5] + extension for name in bodies for extension in ('.body', '.json')
+    )
+    requests = server.requests['search']
+    cache.get(urls[0])
+    cache.get(urls[-1])
+    assert server.requests['search'] == requests
+    cache.get(urls[1])
+    assert server.requests['search'] == requests + 1
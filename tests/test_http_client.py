@@ -0,0 +1,128 @@
+'''
+Checks how HTTPClient retries and decodes responses, against a local server
+that answers every request with the next of a scripted list of responses.
+'''
+import email.utils
+import gzip
+import http.server
+import threading
+import time
+import urllib.error
+import pytest
+import http_client
+
+
+class Sleeps:
+    'Stands in for the time module in http_client, recording sleeps instead of waiting.'
+    def __init__(self):
+        self.slept = []
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+
+    def time(self) -> float:
+        return time.time()
+
+
+class ScriptedServer(http.server.ThreadingHTTPServer):
+    'Answers each request with the next (status, headers, body) of responses.'
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.responses = []
+        self.requests = 0
+
+    def get_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        status, headers, body = self.server.responses.pop(0)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope = 'module')
+def running_server():
+    server = ScriptedServer()
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def server(running_server):
+    running_server.responses.clear()
+    running_server.requests = 0
+    return running_server
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = Sleeps()
+    monkeypatch.setattr(http_client, 'time', sleeps)
+    return sleeps
+
+
+def test_gzip_responses_are_decoded(server, sleeps):
+    server.responses = [(200, {'Content-Encoding': 'gzip'}, gzip.compress(b'{"ok": true}'))]
+    assert http_client.HTTPClient().request(server.get_url()).body == b'{"ok": true}'
+
+
+@pytest.mark.parametrize('encoding, body', [
+    ('gzip', b'not gzip'),
+    ('gzip', gzip.compress(b'{"ok": true}')[:-6]),
+    ('deflate', b'not deflate')
+])
+def test_undecodable_responses_raise_url_error(server, sleeps, encoding, body):
+    server.responses = [(200, {'Content-Encoding': encoding}, body)] * 2
+    with pytest.raises(urllib.error.URLError) as raised:
+        http_client.HTTPClient(retries = 1).request(server.get_url())
+    assert not isinstance(raised.value.reason, urllib.error.URLError)
+    assert server.requests == 2
+
+
+def test_backoff_without_retry_after(server, sleeps):
+    server.responses = [(503, {}, b''), (500, {}, b''), (200, {}, b'done')]
+    assert http_client.HTTPClient(retries = 2, backoff = 0.5).request(server.get_url()).body == b'done'
+    assert sleeps.slept == [0.5, 1.0]
+
+
+def test_retry_after_seconds_is_honored(server, sleeps):
+    server.responses = [(429, {'Retry-After': '7'}, b''), (503, {'Retry-After': '2'}, b''), (200, {}, b'done')]
+    assert http_client.HTTPClient(retries = 2).request(server.get_url()).body == b'done'
+    assert sleeps.slept == [7.0, 2.0]
+
+
+def test_retry_after_date_is_honored(server, sleeps):
+    date = email.utils.formatdate(time.time() + 30, usegmt = True)
+    server.responses = [(503, {'Retry-After': date}, b''), (200, {}, b'done')]
+    assert http_client.HTTPClient(retries = 1).request(server.get_url()).body == b'done'
+    assert len(sleeps.slept) == 1 and 25 <= sleeps.slept[0] <= 30
+
+
+def test_retry_after_past_the_limit_is_not_waited_for(server, sleeps):
+    server.responses = [(429, {'Retry-After': str(int(http_client.MAX_RETRY_AFTER) + 1)}, b'')]
+    with pytest.raises(urllib.error.HTTPError) as raised:
+        http_client.HTTPClient(retries = 2).request(server.get_url())
+    assert raised.value.code == 429
+    assert sleeps.slept == []
+    assert server.requests == 1
+
+
+def test_unreadable_retry_after_falls_back_to_backoff(server, sleeps):
+    server.responses = [(429, {'Retry-After': 'soon'}, b''), (200, {}, b'done')]
+    assert http_client.HTTPClient(retries = 1, backoff = 0.25).request(server.get_url()).body == b'done'
+    assert sleeps.slept == [0.25]
@@ -0,0 +1,41 @@
+'''
+Checks that WEATHERAPI_METRICS enables the exporters it lists, and that specs
+it doesn't understand are reported instead of raised.
+'''
+import pytest
+import instrumentation
+
+
+@pytest.fixture(autouse = True)
+def disabled():
+    'Leaves instrumentation disabled and empty after every test.'
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_exporters_are_enabled_from_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv(instrumentation.ENVIRONMENT_VARIABLE, f'stderr, jsonl:{tmp_path / "spans.jsonl"}')
+    instrumentation.enable_from_environment()
+    assert instrumentation.is_enabled()
+    assert [type(exporter) for exporter in instrumentation._exporters] == [
+        instrumentation.StderrExporter, instrumentation.JSONLinesExporter
+    ]
+
+
+def test_bad_specs_are_reported_and_ignored(monkeypatch, capsys):
+    monkeypatch.setenv(instrumentation.ENVIRONMENT_VARIABLE, 'stdrr,prometheus:-,jsonl')
+    instrumentation.enable_from_environment()
+    assert [type(exporter) for exporter in instrumentation._exporters] == [instrumentation.PrometheusExporter]
+    errors = capsys.readouterr().err.splitlines()
+    assert errors == [
+        f'{instrumentation.ENVIRONMENT_VARIABLE}: unknown metrics exporter: stdrr, ignored',
+        f'{instrumentation.ENVIRONMENT_VARIABLE}: unknown metrics exporter: jsonl, ignored'
+    ]
+
+
+def test_only_bad_specs_leave_instrumentation_disabled(monkeypatch, capsys):
+    monkeypatch.setenv(instrumentation.ENVIRONMENT_VARIABLE, 'nothing')
+    instrumentation.enable_from_environment()
+    assert not instrumentation.is_enabled()
+    assert 'nothing' in capsys.readouterr().err
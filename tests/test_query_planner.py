@@ -0,0 +1,34 @@
+'''
+Checks which queries parse_query accepts and how answers are formatted.
+'''
+import pytest
+import query_planner
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('WIND 24 MAX', ('wind', None, 0, 24, 'MAX')),
+    ('HUMIDITY 12-36 P90', ('humidity', None, 12, 36, 'P90')),
+    ('TEMPERATURE AIR F DAILY MIN', ('temperature', 'F', None, None, 'MIN')),
+    ('PRECIPITATION 48 SUM', ('precipitation', None, 0, 48, 'SUM'))
+])
+def test_parses_supported_queries(query, expected):
+    assert query_planner.parse_query(query) == expected
+
+
+@pytest.mark.parametrize('query', [
+    'WIND 5-2 MAX',
+    'WIND 3-3 MAX',
+    'WIND 0 MAX',
+    'TEMPERATURE AIR F 24 SUM',
+    'WIND 24 P101',
+    'NO MORE QUERIES'
+])
+def test_skips_unsupported_and_empty_queries(query):
+    assert query_planner.parse_query(query) is None
+
+
+def test_sums_of_percentages_have_no_percent_sign():
+    time = '2024-01-01T00:00:00Z'
+    assert query_planner._format('precipitation', None, 'SUM', time, 2608.0) == f'{time} 2608.0000'
+    assert query_planner._format('precipitation', None, 'AVG', time, 26.5) == f'{time} 26.5000%'
+    assert query_planner._format('humidity', None, 'MAX', time, 97.0) == f'{time} 97.0000%'
@@ -0,0 +1,62 @@
+'''
+Checks the conversion of forecast start times, and their offsets from UTC,
+against datetime.
+'''
+import array
+import datetime
+import pytest
+import timestamps
+
+TIMES = [
+    '2024-01-01T05:00:00-08:00',
+    '2024-01-01T23:30:00-08:00',
+    '2024-03-10T03:00:00-07:00',
+    '2024-06-30T12:45:15+05:30',
+    '2024-12-31T23:00:00+14:00',
+    '2024-02-29T00:00:00Z',
+    '2024-07-04T09:00:00+00:00'
+]
+
+
+def expected_epoch(time_string: str) -> int:
+    return int(datetime.datetime.fromisoformat(time_string.replace('Z', '+00:00')).timestamp())
+
+
+def expected_offset(time_string: str) -> int:
+    return int(datetime.datetime.fromisoformat(time_string.replace('Z', '+00:00')).utcoffset().total_seconds())
+
+
+@pytest.mark.parametrize('time_string', TIMES)
+def test_to_epoch(time_string):
+    assert timestamps.to_epoch(time_string) == expected_epoch(time_string)
+    assert timestamps.utc_offset(time_string) == expected_offset(time_string)
+
+
+def test_bulk_to_epoch_returns_offsets():
+    offsets = array.array('q')
+    epochs = timestamps.bulk_to_epoch(TIMES * 2, offsets)
+    assert list(epochs) == [expected_epoch(time_string) for time_string in TIMES * 2]
+    assert list(offsets) == [expected_offset(time_string) for time_string in TIMES * 2]
+
+
+def test_bulk_to_epoch_parses_other_formats():
+    times = ['2024-01-01T05:00:00.500-08:00', '2024-01-01T05:00-08:00', '2024-01-01T13:00:00+00:00']
+    offsets = array.array('q')
+    epochs = timestamps.bulk_to_epoch(times, offsets)
+    assert list(epochs) == [expected_epoch(time_string) for time_string in times]
+    assert list(offsets) == [-8 * 3600, -8 * 3600, 0]
+
+
+@pytest.mark.parametrize('time_string, date', [
+    ('2024-01-01T05:00:00-08:00', '2024-01-01'),
+    ('2024-01-01T23:30:00-08:00', '2024-01-01'),
+    ('2024-12-31T23:00:00+14:00', '2024-12-31'),
+    ('2024-03-01T00:15:00+05:30', '2024-03-01')
+])
+def test_format_date_uses_the_local_day(time_string, date):
+    assert timestamps.format_date(timestamps.to_epoch(time_string), timestamps.utc_offset(time_string)) == date
+
+
+def test_format_utc():
+    assert timestamps.to_utc_string('2024-01-01T05:00:00-08:00') == '2024-01-01T13:00:00Z'
+    assert timestamps.to_utc_string('2024-06-30T12:45:15+05:30') == '2024-06-30T07:15:15Z'
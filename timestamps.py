@@ -0,0 +1,104 @@
+'''
+Converts the ISO-8601 start times given by the National Weather Service, such
+as 2024-01-01T05:00:00-08:00, into seconds since the epoch and into the UTC
+format given in the specifications, 2024-01-01T13:00:00Z. The offset in the
+time string is used for the conversion, rather than the time zone of the
+computer, and results are cached since forecasts repeat the same times.
+'''
+import array
+import calendar
+import datetime
+import functools
+import time
+from collections.abc import Iterable
+
+CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize = CACHE_SIZE)
+def to_epoch(time_string: str) -> int:
+    '''
+    Returns the seconds since the epoch of an ISO-8601 time. Times without an
+    offset are taken as local time.
+    '''
+    if len(time_string) == 25 and time_string[19] in '+-':
+        return _day(time_string[:10]) + _seconds(time_string) - _offset(time_string[19:])
+    elif len(time_string) == 20 and time_string[19] == 'Z':
+        return _day(time_string[:10]) + _seconds(time_string)
+    return int(datetime.datetime.fromisoformat(time_string).timestamp())
+
+
+@functools.lru_cache(maxsize = CACHE_SIZE)
+def format_utc(epoch: int) -> str:
+    'Returns the seconds since the epoch as a UTC time like 2024-01-01T13:00:00Z.'
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
+
+
+def to_utc_string(time_string: str) -> str:
+    'Returns an ISO-8601 time converted to a UTC time like 2024-01-01T13:00:00Z.'
+    return format_utc(to_epoch(time_string))
+
+
+def bulk_to_epoch(time_strings: Iterable[str], utc_offsets: array.array | None = None) -> array.array:
+    '''
+    Returns the seconds since the epoch of every time in time_strings, in one
+    step. Only the first time of every day and every distinct offset is fully
+    parsed, so a whole forecast converts with a few slices per period. The
+    offset of every time, in seconds east of UTC, is appended to utc_offsets
+    if given.
+    '''
+    epochs = array.array('q')
+    days = {}
+    offsets = {}
+    for time_string in time_strings:
+        if len(time_string) == 25 and time_string[19] in '+-':
+            offset = time_string[19:]
+        elif len(time_string) == 20 and time_string[19] == 'Z':
+            offset = 'Z'
+        else:
+            epochs.append(to_epoch(time_string))
+            if utc_offsets is not None:
+                utc_offsets.append(utc_offset(time_string))
+            continue
+        day = time_string[:10]
+        if day not in days:
+            days[day] = _day(day)
+        if offset not in offsets:
+            offsets[offset] = 0 if offset == 'Z' else _offset(offset)
+        epochs.append(days[day] + _seconds(time_string) - offsets[offset])
+        if utc_offsets is not None:
+            utc_offsets.append(offsets[offset])
+    return epochs
+
+
+def utc_offset(time_string: str) -> int:
+    '''
+    Returns the offset of an ISO-8601 time in seconds east of UTC. Times
+    without an offset are taken as local time.
+    '''
+    parsed = datetime.datetime.fromisoformat(time_string)
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return int(parsed.utcoffset().total_seconds())
+
+
+def format_date(epoch: int, offset: int) -> str:
+    'Returns the local date, like 2024-01-01, of seconds since the epoch at an offset east of UTC.'
+    return time.strftime('%Y-%m-%d', time.gmtime(epoch + offset))
+
+
+@functools.lru_cache(maxsize = CACHE_SIZE)
+def _day(date: str) -> int:
+    'Returns the seconds since the epoch at the start of a YYYY-MM-DD date in UTC.'
+    return calendar.timegm((int(date[0:4]), int(date[5:7]), int(date[8:10]), 0, 0, 0))
+
+
+def _seconds(time_string: str) -> int:
+    'Returns the seconds into the day of the HH:MM:SS part of a time.'
+    return int(time_string[11:13]) * 3600 + int(time_string[14:16]) * 60 + int(time_string[17:19])
+
+
+def _offset(offset: str) -> int:
+    'Returns the seconds east of UTC of an offset like -08:00.'
+    seconds = int(offset[1:3]) * 3600 + int(offset[4:6]) * 60
+    return -seconds if offset[0] == '-' else seconds